@@ -0,0 +1,119 @@
+# Importing different DASH components
+import dash_bootstrap_components as dbc
+from dash.dependencies import Input, Output
+import dash_core_components as dcc
+import dash_html_components as html
+
+# Make the 'app' local
+from main import app
+
+# Importing usual Python modules
+import pandas as pd
+
+# Local Modules
+import metrics as mx
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+myvars = GlobVars()
+COLORS = myvars.colors
+# Seconds are shown in milliseconds
+MS = 1000
+
+
+# ---------------------------------- #
+#             PAGE LAYOUT            #
+# ---------------------------------- #
+
+# Numbers of the worker that answers, refreshed every few seconds
+layout = dbc.Container(
+    [
+        html.Br(),
+        html.H3("Callback Latency", style={'color': COLORS['success']}),
+        html.P("Quantiles over the last {} calls of each callback, in "
+               "milliseconds. Prometheus reads the same numbers on /metrics."
+               .format(myvars.metricwindow),
+               style={'color': '#5D6D7E'}),
+        dcc.Interval(id='metrics-interval', interval=5000, n_intervals=0),
+        html.Div(id='latency-table'),
+        html.H4("Market Data", style={'color': COLORS['success']}),
+        html.Div(id='upstream-table'),
+        html.H4("Startup", style={'color': COLORS['success']}),
+        html.Div(id='startup-table'),
+        html.H4("Slow Callbacks", style={'color': COLORS['success']}),
+        html.Div(id='slow-profiles'),
+    ],
+    fluid=True,
+)
+
+
+# ---------------------------------- #
+#             CALLBACKS              #
+# ---------------------------------- #
+
+def latency_frame():
+    wall = mx.REGISTRY.table('callback_seconds')
+    fetch = mx.REGISTRY.table('callback_upstream_seconds')
+    serial = mx.REGISTRY.table('callback_serialize_seconds')
+    size = mx.REGISTRY.table('callback_payload_bytes')
+    return pd.DataFrame({
+        'Callback': wall.index,
+        'Wall p50': MS * wall['p50'],
+        'Wall p95': MS * wall['p95'],
+        'Wall p99': MS * wall['p99'],
+        'Upstream p95': MS * fetch['p95'].reindex(wall.index),
+        'Serialize p95': MS * serial['p95'].reindex(wall.index),
+        'Payload p50 (KB)': size['p50'].reindex(wall.index) / 1024,
+        'Calls': wall['count'],
+    }).round(1)
+
+
+def upstream_frame():
+    upstream = mx.REGISTRY.table('upstream_seconds')
+    return pd.DataFrame({
+        'Source': upstream.index,
+        'p50': MS * upstream['p50'],
+        'p95': MS * upstream['p95'],
+        'p99': MS * upstream['p99'],
+        'Calls': upstream['count'],
+    }).round(1)
+
+
+def startup_frame():
+    return pd.DataFrame({
+        'Stage': list(mx.STARTUP),
+        'Seconds': list(mx.STARTUP.values()),
+    }).round(2)
+
+
+def frame_table(df):
+    return dbc.Table.from_dataframe(df, bordered=True, hover=True,
+                                    striped=True, size='sm')
+
+
+@app.callback(
+    [Output('latency-table', 'children'),
+     Output('upstream-table', 'children'),
+     Output('startup-table', 'children'),
+     Output('slow-profiles', 'children')],
+    [Input('metrics-interval', 'n_intervals')]
+)
+def metrics_tables(n_intervals):
+    if myvars.profileslow is None:
+        slow = html.P("Profiling is off, set `profileslow` in settings.py.")
+    else:
+        slow = [
+            html.Details([
+                html.Summary('{time}  {callback}  {seconds:.2f}s'.format(
+                    **profile)),
+                html.Pre(profile['stats']),
+            ])
+            for profile in list(mx.SLOW)
+        ] or html.P("None slower than {}s.".format(myvars.profileslow))
+
+    return (frame_table(latency_frame()), frame_table(upstream_frame()),
+            frame_table(startup_frame()), slow)
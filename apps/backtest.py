@@ -3,16 +3,33 @@
 # ---------------------------------- #
 
 # Dash components
+import dash
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_core_components as dcc
 import dash_html_components as html
+import dash_table
+import dash_table.FormatTemplate as FormatTemplate
+from dash_table.Format import Format, Scheme
 
 # Make my 'app' local
 from main import app
 from settings import GlobVars
 
 # Importing standard Python modules
+import pandas as pd
+
+# Local Modules
+import engine as eg
+import jobs as jb
+import panel as pn
+import sweep as sw
+import plotsty as pls
+import rollups as rlp
+import intraday as itd
+import benchmarks as bmk
+import providers as pvd
 
 # ---------------------------------- #
 #           CSS STYLE SHEETS         #
@@ -21,6 +38,10 @@ from settings import GlobVars
 myvars = GlobVars()
 TODAY = myvars.today
 HISTORY = myvars.history
+OHLC_STORE = pvd.OHLCStore()
+INTRADAY_STORE = itd.IntradayStore()
+# Backtests run in the background, the page polls their progress
+JOBS = jb.JobQueue()
 
 sideBar = {
     'position': 'fixed',
@@ -67,6 +88,7 @@ set_balance = dbc.FormGroup(
     dbc.Row([
         dbc.Col(
             dbc.Input(
+                id='test-balance',
                 placeholder="Balance",
                 type="text",
                 value='10000',
@@ -125,9 +147,14 @@ interval_dropdown = dbc.FormGroup(
             dcc.Dropdown(
                 id='test-interval',
                 options=[
+                    {'label': '1 Minute', 'value': '1m'},
+                    {'label': '5 Minutes', 'value': '5m'},
+                    {'label': 'Hourly', 'value': '1h'},
                     {'label': 'Daily', 'value': 'D'},
                     {'label': 'Weekly', 'value': 'W'},
-                    {'label': 'Monthly', 'value': 'M'}],
+                    {'label': 'Monthly', 'value': 'M'},
+                    {'label': 'Quarterly', 'value': 'Q'},
+                    {'label': 'Yearly', 'value': 'Y'}],
                 value='D',
                 clearable=False,
                 style=dropdownStyle
@@ -289,11 +316,14 @@ stock_pick = dbc.Row([
         id='symbol', name='search',
         placeholder='AAPL',
         value='aapl', bs_size="lg",
+        list='ticker-list', autoComplete='off',
         style={
             'height': '43px',
             'width': '100px',
         },
     ),
+    # Filled by research.ticker_suggestions
+    html.Datalist(id='ticker-list'),
     dbc.Col(
         html.I(className="fas fa-search fa-1x",
                style={'background-color': 'white'}
@@ -307,6 +337,7 @@ strategy_selector = dbc.InputGroup(
     [
         dbc.InputGroupAddon("Strategy", addon_type="prepend"),
         dbc.Select(
+            id='test-strategy',
             options=[
                 {'label': 'Buy and Hold', 'value': 'BH'},
                 {'label': 'Dollar Cost Averaging', 'value': 'DCA'},
@@ -345,6 +376,7 @@ stock_strat = dbc.Row(
         ),
         dbc.Col(
             dbc.Button("Abort",
+                       id="abort-button",
                        color="danger", className="mr-1",
                        style={'font-size': '16px',
                               'font-weight': '600',
@@ -360,6 +392,33 @@ stock_strat = dbc.Row(
     align='center',
 )
 
+# Parameter sweep: every combination of the given ranges is backtested
+sweep_mode = dbc.Row(
+    [
+        dbc.Col(
+            dbc.Checklist(
+                options=[{"label": "Sweep", "value": 1}],
+                value=[],
+                id="sweep-mode",
+                switch=True,
+            ),
+            width='auto',
+        ),
+        dbc.Col(
+            dbc.Input(
+                id='sweep-grid',
+                type="text",
+                placeholder=sw.DEFAULT_GRIDS['BH'],
+                bs_size="sm",
+            ),
+            width=5,
+        ),
+    ],
+    justify='center',
+    align='center',
+    style={'margin-top': '15px'},
+)
+
 portfolio_plot = dbc.Container([
                     html.Div(
                         dbc.Spinner(
@@ -372,9 +431,12 @@ portfolio_plot = dbc.Container([
                     )
                 ])
 
+# Progress of the running backtest job, polled only while one runs
 progress_bar = html.Div([
-    dcc.Interval(id="progress-interval", n_intervals=0, interval=500),
-    dbc.Progress(id="progress", striped=True),
+    dcc.Store(id='job-id'),
+    dcc.Interval(id="progress-interval", n_intervals=0, interval=500,
+                 disabled=True),
+    dbc.Progress(id="progress", striped=True, animated=True),
 ]
 )
 
@@ -387,9 +449,12 @@ layout = html.Div(
         side_bar,
         html.Br(),
         stock_strat,
-        # dbc.Col(progress_bar,
-        #     width=3,
-        #     style={'left': '600px', 'top':'300px'})
+        sweep_mode,
+        dbc.Row(
+            dbc.Col(progress_bar, width=4),
+            justify='center',
+            style={'margin-top': '15px'},
+        ),
         portfolio_plot,
     ]
 )
@@ -399,24 +464,211 @@ layout = html.Div(
 #             CALLBACKS              #
 # ---------------------------------- #
 
+def stats_table(stats):
+    pct = '{:.2%}'.format
+    rows = [
+        ("Total Return", pct(stats['return'])),
+        ("Annual Return", pct(stats['cagr'])),
+        ("Volatility", pct(stats['volatility'])),
+        ("Sharpe Ratio", '{:.2f}'.format(stats['sharpe'])),
+        ("Max Drawdown", pct(stats['drawdown'])),
+        ("Trades", stats['trades']),
+        ("Time in Market", pct(stats['exposure'])),
+    ]
+    if 'benchmark' in stats:
+        rows.append(("Benchmark Return", pct(stats['benchmark'])))
+        rows.append(("Beta", '{:.2f}'.format(stats['beta'])))
+        rows.append(("Correlation", '{:.2f}'.format(stats['correlation'])))
+
+    return dbc.Table(
+        html.Tbody([html.Tr([html.Td(name), html.Td(value)])
+                    for name, value in rows]),
+        bordered=True,
+        hover=True,
+        striped=True,
+    )
+
+
+def metrics_table(table):
+    percent = FormatTemplate.percentage(2)
+    fixed = Format(precision=2, scheme=Scheme.fixed)
+    formats = {'return': percent, 'cagr': percent, 'volatility': percent,
+               'drawdown': percent, 'sharpe': fixed}
+    columns = [dict(name=name.title(), id=name,
+                    type='numeric' if table[name].dtype.kind in 'iuf' else 'text',
+                    format=formats.get(name, Format()))
+               for name in table.columns]
+
+    return dash_table.DataTable(
+        columns=columns,
+        data=table.to_dict('records'),
+        sort_action='native',
+        page_size=20,
+        style_cell={'font-family': myvars.font, 'padding': '0px 10px'},
+        style_header={'font-weight': '600'},
+    )
+
+
 @app.callback(
-    [Output("progress", "value"), Output("progress", "children")],
-    [Input("progress-interval", "n_intervals")],
+    Output('sweep-grid', 'placeholder'),
+    [Input('test-strategy', 'value')]
 )
-def update_progress(n):
-    # check progress of some background process, in this example we'll just
-    # use n_intervals constrained to be in 0-100
-    progress = min(n % 110, 100)
-    # only add text after 5% progress to ensure text isn't squashed too much
-    return progress, f"{progress} %" if progress >= 5 else ""
+def sweep_placeholder(strategy):
+    return sw.DEFAULT_GRIDS.get(strategy, '')
 
 
 @app.callback(
-    Output("loading-output", "children"), [Input("loading-button", "n_clicks")]
+    Output('job-id', 'data'),
+    [Input("loading-button", "n_clicks"), Input("abort-button", "n_clicks")],
+    [State('symbol', 'value'), State('test-strategy', 'value'),
+     State('start-date', 'date'), State('end-date', 'date'),
+     State('test-balance', 'value'), State('test-interval', 'value'),
+     State('test-field', 'value'), State('sizerule_selector', 'value'),
+     State('test-benchmark', 'value'), State('sweep-mode', 'value'),
+     State('sweep-grid', 'value'), State('job-id', 'data')]
 )
-def load_output(n):
-    import time
-    if n:
-        time.sleep(1)
-        return f"Output loaded {n} times"
-    pass
+def control_job(run_clicks, abort_clicks, symb, strategy, start, end, balance,
+                interval, field, sizing, benchmark, sweep_bool, grid, job_id):
+    trigger = dash.callback_context.triggered[0]['prop_id']
+    if not (run_clicks or abort_clicks):
+        raise PreventUpdate
+
+    # A new run replaces the previous one of this session
+    if job_id:
+        JOBS.cancel(job_id)
+    if trigger.startswith('abort-button'):
+        return job_id
+
+    return JOBS.submit(backtest_job, symb, strategy, start, end, balance,
+                       interval, field, sizing, benchmark, sweep_bool, grid)
+
+
+@app.callback(
+    [Output("progress", "value"), Output("progress", "children"),
+     Output("loading-output", "children"),
+     Output("progress-interval", "disabled")],
+    [Input("progress-interval", "n_intervals"), Input('job-id', 'data')]
+)
+def update_progress(n, job_id):
+    state = JOBS.status(job_id) if job_id else None
+    if state is None:
+        raise PreventUpdate
+
+    progress = int(state['progress'])
+    # only add text after 5% progress to ensure text isn't squashed too much
+    label = f"{progress} %" if progress >= 5 else ""
+
+    if state['status'] == 'done':
+        return progress, label, JOBS.result(job_id), True
+    elif state['status'] == 'cancelled':
+        return 0, "", dbc.Alert("Backtest aborted.", color='secondary'), True
+    elif state['status'] == 'failed':
+        return 0, "", dbc.Alert("Backtest failed: " + (state['message'] or ''),
+                                color='danger'), True
+    return progress, label, dash.no_update, False
+
+
+def backtest_job(symb, strategy, start, end, balance, interval, field, sizing,
+                 benchmark, sweep_bool, grid, progress):
+    """
+      The Run button's work, executed by the job queue.
+
+      Returns:
+        list: the components to show in the output area
+
+    """
+    try:
+        balance = float(balance)
+    except (TypeError, ValueError):
+        return dbc.Alert("The balance must be a number.", color='warning')
+
+    start = pd.Timestamp(start).date()
+    end = pd.Timestamp(end).date()
+
+    if sweep_bool:
+        grid = grid or sw.DEFAULT_GRIDS[strategy]
+        try:
+            sw.parse_grid(grid, strategy)
+        except ValueError as err:
+            return dbc.Alert("Invalid parameter ranges: {}.".format(err),
+                             color='warning')
+
+    # A list of symbols is backtested as an equal-weight portfolio
+    symbols = pn.parse_symbols(symb)
+    if len(symbols) > 1 and sweep_bool:
+        return dbc.Alert("A sweep runs on a single symbol, enter one symbol "
+                         "or turn Sweep off to backtest the portfolio.",
+                         color='warning')
+    if len(symbols) > 1:
+        return portfolio_output(symbols, strategy, start, end, balance,
+                                interval, field, sizing, benchmark, progress)
+
+    ohlc = load_bars(symb, start, end, interval)
+    if ohlc.empty:
+        return dbc.Alert("No price history for " + symb.upper(),
+                         color='warning')
+    progress(0.2, 'Data loaded')
+
+    if sweep_bool:
+        table = sw.run_sweep(ohlc, strategy, grid,
+                             sizing, balance, field, interval,
+                             progress=jb.subtask(progress, 0.2, 0.95))
+        return metrics_table(table)
+
+    result = eg.run(ohlc, strategy, sizing, balance, field, interval,
+                    benchmark=benchmark_close(benchmark, start, end, interval),
+                    symb=symb.upper())
+    progress(0.6, 'Backtest done')
+
+    return [
+        dcc.Graph(figure=pls.equity_chart(result.ledger, result.fills),
+                  config={'displayModeBar': False}),
+        stats_table(result.stats),
+    ]
+
+
+def load_bars(symb, start, end, interval):
+    """
+      Bars of a symbol between two dates, in the bars of an interval.
+
+    """
+    if interval in itd.INTERVALS:
+        # Only the range is read from the intraday files
+        return INTRADAY_STORE.bars(symb, interval, start, end)
+    ohlc = OHLC_STORE.history(symb, start).loc[str(start):str(end)]
+    return rlp.ROLLUPS.get(symb.upper(), ohlc, interval)
+
+
+def benchmark_close(benchmark, start, end, interval):
+    if not benchmark:
+        return None
+    if interval in itd.INTERVALS or benchmark not in bmk.INDICES:
+        return load_bars(benchmark, start, end, interval)['Close']
+    # Daily and coarser index bars come from the cache shared by all sessions
+    close = bmk.BENCHMARKS.close(benchmark, interval)
+    return close.loc[str(start):str(end)]
+
+
+def portfolio_output(symbols, strategy, start, end, balance, interval, field,
+                     sizing, benchmark, progress):
+    store = INTRADAY_STORE.at(interval) if interval in itd.INTERVALS \
+        else OHLC_STORE
+    panel = pn.load_panel(symbols, store, start, end,
+                          progress=jb.subtask(progress, 0., 0.7))
+    panel = panel.regroup(interval)
+    if not panel.symbols:
+        return dbc.Alert("No price history for " + ', '.join(symbols),
+                         color='warning')
+
+    result = eg.run_portfolio(panel, strategy, sizing, balance, field,
+                              interval, benchmark_close(benchmark, start, end,
+                                                        interval))
+    progress(0.85, 'Backtest done')
+    by_symbol = result.stats.pop('symbols').rename_axis('symbol')
+
+    return [
+        dcc.Graph(figure=pls.equity_chart(result.ledger),
+                  config={'displayModeBar': False}),
+        stats_table(result.stats),
+        metrics_table(by_symbol.reset_index()),
+    ]
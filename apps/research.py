@@ -1,6 +1,8 @@
 # Importing different DASH components
+import dash
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import dash_core_components as dcc
 import dash_html_components as html
 
@@ -9,14 +11,22 @@ from main import app
 
 # Importing usual Python modules
 import datetime as dt
-import pandas as pd
-
-# import Yahoo! Finance libraries
-import yfinance as yf
+import threading
+from cachetools import LRUCache
 
 # Local Modules
 import plotsty as pls
 import organizer as oz
+import providers as pvd
+import framestore as fst
+import rollups as rlp
+import intraday as itd
+import benchmarks as bmk
+import downsample as dsm
+import universe as unv
+import prefetch as pft
+import dividends as dvd
+import figcodec as fcd
 from settings import GlobVars
 
 
@@ -25,8 +35,15 @@ from settings import GlobVars
 # ---------------------------------- #
 
 myvars = GlobVars()
-# Display data for this duration
-DATA_WINDOW = str(myvars.datawindow) + 'y'
+# Daily bars are served from the on-disk cache, shared by all sessions
+OHLC_STORE = pvd.OHLCStore()
+# Datasets stay on the server, the browser only holds their handle
+FRAMES = fst.FrameStore()
+# Minute and hourly bars, read by time range from monthly files
+INTRADAY_STORE = itd.IntradayStore()
+# Price figures by (handle, interval, field), the handle names the data version
+FIGURES = LRUCache(maxsize=32)
+FIGURES_LOCK = threading.Lock()
 # Error when some information is not available
 ERR = myvars.err
 # Theme Colors
@@ -54,9 +71,14 @@ shadowStyle = {'box-shadow': '2px 6px 10px #888888'}
 #           PAGE COMPONENTS          #
 # ---------------------------------- #
 
-# Hidden div inside the app that stores some global variables
+# Hidden div inside the app that stores some global variables.
+# 'ticker-data' holds the handle of the OHLC frame in FRAMES.
+# 'ohlc-base' holds the price figure before the visibility toggles apply.
 ghost_child = html.Div([
     html.Div(id='ticker-data', style={'display': 'none'}),
+    dcc.Store(id='ohlc-base'),
+    # The symbol the page shows, only set once the search box is submitted
+    dcc.Store(id='ticker', data='AAPL'),
 ])
 
 # The Heading
@@ -88,7 +110,8 @@ search_bar = dbc.Container([
                 type="search",
                 id='symbol', name='search',
                 placeholder='AAPL',
-                value='aapl', bs_size="lg",
+                value='AAPL', bs_size="lg",
+                list='ticker-list', autoComplete='off',
                 style=searchStyle,
             ),
             width={'size': 'auto', 'offset': 5}
@@ -103,6 +126,7 @@ search_bar = dbc.Container([
         no_gutters=True,
         justify="center",
     ),
+    html.Datalist(id='ticker-list'),
     html.Br(),
     html.Br(),
     html.Hr(),
@@ -184,9 +208,14 @@ interval_dropdown = dbc.FormGroup(
         dcc.Dropdown(
             id='interval',
             options=[
+                {'label': '1 Minute', 'value': '1m'},
+                {'label': '5 Minutes', 'value': '5m'},
+                {'label': 'Hourly', 'value': '1h'},
                 {'label': 'Daily', 'value': 'D'},
                 {'label': 'Weekly', 'value': 'W'},
-                {'label': 'Monthly', 'value': 'M'}],
+                {'label': 'Monthly', 'value': 'M'},
+                {'label': 'Quarterly', 'value': 'Q'},
+                {'label': 'Yearly', 'value': 'Y'}],
             value='D',  # default value is 'D'
             clearable=False
         )
@@ -306,12 +335,18 @@ holiday_switch = dbc.FormGroup([
     dbc.Row([
         dbc.Checklist(
             options=[
-                {"label": "Holidays", "value": 1, "disabled": True}
+                {"label": "Holidays", "value": 1}
             ],
-            value=[1],
+            value=[],
             id="holiday",
             switch=True,
-        )
+        ),
+        html.I(className="fas fa-info-circle fa-1x", id="holiday_help",
+               style={'color': OCEAN_BOAT, 'padding': '3px 3px'}
+               ),
+        dbc.Tooltip("Show weekends and market holidays on the daily chart. "
+                    "They are hidden by default, so the bars have no gaps.",
+                    target="holiday_help"),
     ])
 ])
 
@@ -398,6 +433,38 @@ layout = html.Div([
 #             CALLBACKS              #
 # ---------------------------------- #
 
+# The backtest page's search box shares the ids, it gets the suggestions too
+@app.callback(
+    Output('ticker-list', 'children'),
+    [Input('symbol', 'value')]
+)
+def ticker_suggestions(text):
+    # A list of symbols is completed on its last one
+    head, _, tail = (text or '').rpartition(',')
+    head = head + ', ' if head else ''
+    return [html.Option(value=head + symb, label=name)
+            for symb, name in unv.UNIVERSE.search(tail)]
+
+
+@app.callback(
+    Output('ticker', 'data'),
+    [Input('symbol', 'n_submit'), Input('symbol', 'n_blur')],
+    [State('symbol', 'value'), State('ticker', 'data')]
+)
+def resolve_symbol(n_submit, n_blur, text, current):
+    # Keystrokes don't reach the data callbacks, a submitted symbol does
+    if (text or '').strip().upper() == current:
+        raise PreventUpdate
+    # A symbol missing from the bundled list must have a price history, the
+    # download is cached for the data callbacks
+    symb = unv.UNIVERSE.resolve(
+        text, confirm=lambda symb: not OHLC_STORE.history(symb).empty)
+    if symb is None:
+        raise PreventUpdate
+    # The data callbacks this fires find the requests already in flight
+    pft.prefetch(symb, OHLC_STORE)
+    return symb
+
 
 @app.callback([
     Output('sector', 'children'), Output('industry', 'children'),
@@ -405,7 +472,7 @@ layout = html.Div([
     Output('officer_title', 'children'), Output('officer_name', 'children'),
     Output('headquarter', 'children'),
 ], [
-    Input('symbol', 'value')]
+    Input('ticker', 'data')]
 )
 def asset_summary(symb):
     profile = oz.asset_profile(symb, 'asset_profile')
@@ -430,7 +497,7 @@ def asset_summary(symb):
     Output('prvs-vol', 'children'), Output('prvs-close', 'children'),
     Output('avg-price', 'children'), Output('low-high', 'children'),
 ], [
-    Input('symbol', 'value')]
+    Input('ticker', 'data')]
 )
 def price_summaries(symb):
     summary = oz.asset_profile(symb, 'summary_detail')
@@ -449,7 +516,7 @@ def price_summaries(symb):
 @app.callback([
     Output('short-name', 'children'), Output('exchange', 'children'),
     Output('ipo-date', 'children')],
-    [Input('symbol', 'value')]
+    [Input('ticker', 'data')]
 )
 def quote_type(symb):
     profile = oz.asset_profile(symb, 'quote_type')
@@ -466,53 +533,143 @@ def quote_type(symb):
 
 @app.callback(
     Output('ticker-data', 'children'),
-    [Input('symbol', 'value')]
+    [Input('ticker', 'data')]
 )
 def clean_data(symb):
-    ticker = yf.Ticker(symb)
-    ohlc = ticker.history(period=DATA_WINDOW)
-
-    # Serialize the output at JSON for faster global callbacks.
-    ohlc_json = ohlc.to_json(orient='table')
-    # This data is saved in the hidden div in the app.
-    # 'table' orientation preserves the DateTime format.
-
-    return ohlc_json
+    ohlc = OHLC_STORE.history(symb)
+
+    # Only the handle goes to the hidden div, the frame stays server-side
+    return FRAMES.put(symb, ohlc)
+
+
+def ticker_frame(handle):
+    """
+      The OHLC frame behind a 'ticker-data' handle.
+
+      Another worker may have stored it and pruned it since, in that case the
+      symbol is loaded again from the OHLC cache.
+
+    """
+    try:
+        return FRAMES.get(handle)
+    except KeyError:
+        symb, _ = fst.split_handle(handle)
+        return FRAMES.get(FRAMES.put(symb, OHLC_STORE.history(symb)))
+
+
+def message_figure(text):
+    """
+      An empty chart that only shows a message.
+
+    """
+    return {
+        "layout": {
+            "xaxis": {"visible": False},
+            "yaxis": {"visible": False},
+            "annotations": [{
+                "text": text,
+                "xref": "paper",
+                "yref": "paper",
+                "showarrow": False,
+                "font": {"size": 20}
+            }]
+        }
+    }
 
 
 @app.callback(
-    Output('ohlc-chart', 'figure'),
-    [Input(component_id='symbol', component_property='value'),
-     Input(component_id='ticker-data', component_property='children'),
+    Output('ohlc-base', 'data'),
+    [Input(component_id='ticker-data', component_property='children'),
      Input(component_id='field', component_property='value'),
      Input(component_id='benchmark', component_property='value'),
      Input(component_id='interval', component_property='value'),
-     Input(component_id='plotype', component_property='value'),
-     Input(component_id='sma', component_property='value'),
-     Input(component_id='volume', component_property='value')]
+     Input(component_id='ohlc-chart', component_property='relayoutData')]
 )
-def price_update(symb, ticker, field, benchmark, interval, ptyp_bool, sma_bool, vol_bool):
-    ohlc = pd.read_json(ticker, orient='table')
-
-    ohlc = oz.regroup_interval(ohlc, interval)
-    # Re-write this to include 'hourly' and 'Benchmark'
-
+def price_update(ticker, field, benchmark, interval, relayout):
+    # A zoom or pan asks for that range at full resolution, anything else
+    # starts over from the whole history
+    xrange = ()
+    trigger = dash.callback_context.triggered
+    if trigger and trigger[0]['prop_id'] == 'ohlc-chart.relayoutData':
+        xrange = dsm.parse_xrange(relayout)
+        if xrange is None:
+            raise PreventUpdate
+
+    symb, _ = fst.split_handle(ticker)
+    if interval in itd.INTERVALS:
+        # Intraday bars are read from disk around the shown range only
+        ohlc, xrange = itd.chart_window(INTRADAY_STORE, symb, interval,
+                                        xrange)
+        if ohlc.empty:
+            return message_figure("No intraday bars for " + symb.upper())
+        key = (ticker, interval, field, xrange, ohlc.index[-1])
+    else:
+        key = (ticker, interval, field, xrange, benchmark)
+
+    # Only new data, interval, field or range needs a new figure
+    with FIGURES_LOCK:
+        if key in FIGURES:
+            return FIGURES[key]
+
+    if interval not in itd.INTERVALS:
+        # Weekly and coarser bars are kept per dataset, not resampled each
+        # time
+        ohlc = rlp.ROLLUPS.get(symb.upper(), ticker_frame(ticker), interval)
+        if ohlc.empty:
+            return message_figure("No price history for " + symb.upper())
+
+        # Nothing was downsampled, the figure already has every bar
+        if xrange and len(ohlc) <= myvars.chartpoints:
+            raise PreventUpdate
+
+    # No bars in the zoomed range, the chart shown stays as it is
+    if xrange and ohlc.loc[xrange[0]:xrange[1]].empty:
+        raise PreventUpdate
+
+    # The index comes from the cache shared by all sessions, daily and
+    # coarser bars only
+    bench = None
+    if benchmark and interval not in itd.INTERVALS:
+        bench = bmk.overlay(ohlc[field],
+                            bmk.BENCHMARKS.close(benchmark, interval),
+                            bmk.WINDOW[interval])
+
+    # Built with every toggle at its default, the browser applies them
     fig = pls.ohlc_chart(
-        symb.upper(), ohlc, field, ptyp_bool, sma_bool, vol_bool
+        symb.upper(), ohlc, field, True, [], [0], interval, xrange,
+        bench=bench, bench_name=bmk.NAMES.get(benchmark, benchmark)
     )
+    # Zoom survives the redraw, a new dataset or interval resets it
+    fig.update_layout(uirevision='|'.join([ticker, interval, field]))
+    fig = fig.to_dict()
+    if myvars.chartbinary:
+        fig = fcd.encode(fig)
+    with FIGURES_LOCK:
+        FIGURES[key] = fig
     return fig
 
 
+# Chart style, moving averages, volume and holidays only change what is
+# shown, that is done in the browser (assets/clientside.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='research', function_name='ohlc_visibility'),
+    Output('ohlc-chart', 'figure'),
+    [Input('ohlc-base', 'data'),
+     Input('plotype', 'value'),
+     Input('sma', 'value'),
+     Input('volume', 'value'),
+     Input('holiday', 'value')]
+)
+
+
 @app.callback(
     Output('dividend-chart', 'figure'),
     [Input(component_id='ticker-data', component_property='children')]
 )
 def dividend_info(ticker):
-    ohlc = pd.read_json(ticker, orient='table')
-
-    divi_per_share = ohlc[ohlc.Dividends != 0]
+    divs = dvd.DIVIDENDS.get(ticker, ticker_frame(ticker))
 
-    if divi_per_share.empty:
+    if divs['events'].empty:
         return {
             "layout": {
                 "xaxis": {"visible": False},
@@ -527,4 +684,4 @@ def dividend_info(ticker):
             }
         }
     else:
-        return pls.div_chart(divi_per_share)
+        return pls.div_chart(divs)
@@ -0,0 +1,82 @@
+// Callbacks that run in the browser, see apps/research.py
+
+// Figures encoded by figcodec.py, decoded once per stored figure
+var decodedFigures = new WeakMap();
+
+function decodeArray(spec) {
+    if (!spec.bdata) {
+        return spec.values;
+    }
+    // Little-endian float64, as NumPy wrote them
+    var text = atob(spec.bdata);
+    var bytes = new Uint8Array(text.length);
+    for (var i = 0; i < text.length; i++) {
+        bytes[i] = text.charCodeAt(i);
+    }
+    return new Float64Array(bytes.buffer);
+}
+
+function decodeFigure(figure) {
+    if (!figure.arrays) {
+        return figure;
+    }
+    if (!decodedFigures.has(figure)) {
+        var arrays = figure.arrays.map(decodeArray);
+        var data = figure.data.map(function(trace) {
+            var copy = Object.assign({}, trace);
+            Object.keys(copy).forEach(function(key) {
+                var value = copy[key];
+                if (value !== null && typeof value === 'object' &&
+                        'pooled' in value) {
+                    copy[key] = arrays[value.pooled];
+                }
+            });
+            return copy;
+        });
+        decodedFigures.set(figure, {data: data, layout: figure.layout});
+    }
+    return decodedFigures.get(figure);
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    research: {
+        // Show or hide the price chart's traces, and the closed days,
+        // without a server round trip.
+        // `base` is the cached figure, its traces are tagged by `meta` in
+        // plotsty.ohlc_chart.
+        ohlc_visibility: function(base, ptyp_bool, sma_bool, vol_bool,
+                                  holiday_bool) {
+            if (!base) {
+                return window.dash_clientside.no_update;
+            }
+            base = decodeFigure(base);
+            var sma = sma_bool || [];
+            var visible = {
+                'candles': !ptyp_bool,
+                'line': Boolean(ptyp_bool),
+                'sma200': sma.indexOf(200) > -1,
+                'sma50': sma.indexOf(50) > -1,
+                'volume': vol_bool[vol_bool.length - 1] === 1,
+                'volume-ma': vol_bool[vol_bool.length - 1] === 1
+            };
+            // Only the trace objects are copied, their data arrays are shared
+            var data = base.data.map(function(trace) {
+                if (!(trace.meta in visible)) {
+                    return trace;
+                }
+                return Object.assign({}, trace, {visible: visible[trace.meta]});
+            });
+            var figure = Object.assign({}, base, {data: data});
+            // Daily charts hide the closed days unless holidays are shown
+            var meta = base.layout && base.layout.meta;
+            if (meta && meta.rangebreaks) {
+                var show = (holiday_bool || []).indexOf(1) > -1;
+                var xaxis = Object.assign({}, base.layout.xaxis, {
+                    rangebreaks: show ? [] : meta.rangebreaks
+                });
+                figure.layout = Object.assign({}, base.layout, {xaxis: xaxis});
+            }
+            return figure;
+        }
+    }
+});
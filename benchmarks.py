@@ -0,0 +1,172 @@
+import time
+import threading
+import logging as log
+
+import pandas as pd
+
+import organizer as oz
+import prefetch as pf
+import providers as pvd
+import tradecal as tc
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+logger = log.getLogger(__name__)
+
+myvars = GlobVars()
+
+# The indices of the benchmark dropdowns
+INDICES = ['^GSPC', '^DJI', '^IXIC', '^RUT']
+NAMES = {'^GSPC': 'S&P 500', '^DJI': 'Dow Jones', '^IXIC': 'NASDAQ',
+         '^RUT': 'Russell'}
+
+# Bars in the rolling beta and correlation of each interval
+WINDOW = {'D': 63, 'W': 26, 'M': 12, 'Q': 8, 'Y': 5}
+
+# Seconds before a load where an index failed is tried again
+RETRY = 60
+
+
+# ---------------------------------- #
+#           BENCHMARK CACHE          #
+# ---------------------------------- #
+
+class BenchmarkCache:
+    """
+      Closing prices of the benchmark indices, shared by all sessions.
+
+      The indices are loaded together and aligned on the exchange's trading
+      days, with the gaps forward filled. They are
+      reloaded once the OHLC store may have new bars. Each interval's bars
+      are resampled once per load.
+
+      One thread reloads them, concurrently, while the others keep reading
+      the previous closes. An index that fails keeps its previous closes and
+      is tried again after `RETRY` seconds.
+
+    """
+
+    def __init__(self, store=None, refresh=None):
+        self.store = store or pvd.OHLCStore()
+        self.refresh = myvars.refresh if refresh is None else refresh
+        self._lock = threading.Lock()
+        self._reloading = threading.Lock()
+        self._loaded = None
+        self._levels = {}
+
+    def _stale(self):
+        return self._loaded is None or \
+            time.time() - self._loaded > self.refresh
+
+    def _history(self, index):
+        try:
+            return self.store.history(index)['Close']
+        except Exception:
+            logger.exception('Could not load the benchmark %s', index)
+            return None
+
+    def _reload(self):
+        # Only the first load makes the other threads wait
+        if not self._reloading.acquire(blocking=self._loaded is None):
+            return
+        try:
+            if self._stale():
+                self._load()
+        finally:
+            self._reloading.release()
+
+    def _load(self):
+        previous = self._levels.get('D')
+        closes = {}
+        failed = False
+        for index, close in zip(INDICES,
+                                pf.EXECUTOR.map(self._history, INDICES)):
+            if close is None:
+                failed = True
+                close = pd.Series(dtype=float) if previous is None \
+                    else previous[index].dropna()
+            closes[index] = close
+        closes = pd.DataFrame(closes)
+        closes = closes[tc.is_session(closes.index)]
+
+        loaded = time.time()
+        if failed:
+            loaded -= max(self.refresh - RETRY, 0)
+        with self._lock:
+            self._levels = {'D': closes.ffill()}
+            self._loaded = loaded
+
+    def closes(self, interval='D'):
+        """
+          Closing prices of every index, one column each.
+
+          Parameters:
+            interval (str): (default: 'D') 'D' or a key of
+              organizer.RESAMPLE_FREQ
+
+          Returns:
+            DataFrame: shared, do not modify it
+
+        """
+        if self._stale():
+            self._reload()
+        with self._lock:
+            if interval not in self._levels:
+                freq = oz.RESAMPLE_FREQ[interval]
+                closes = self._levels['D'].resample(freq).last()
+                closes.index = tc.roll_back(closes.index)
+                self._levels[interval] = closes
+            return self._levels[interval]
+
+    def close(self, index, interval='D'):
+        return self.closes(interval)[index].dropna()
+
+
+# Shared by the pages of a worker
+BENCHMARKS = BenchmarkCache()
+
+
+def overlay(price, bench, window):
+    """
+      A benchmark next to a price series.
+
+      Parameters:
+        price (Series): the symbol's prices
+        bench (Series): the benchmark's closing prices
+        window (int): bars of the rolling statistics
+
+      Returns:
+        DataFrame: on the index of `price`, the benchmark 'Close' (last
+          known value on each bar) and the rolling 'Beta' and 'Correlation'
+          of the symbol's returns against the benchmark's.
+
+    """
+    bench = bench.reindex(price.index, method='ffill')
+    returns = price.pct_change()
+    bench_returns = bench.pct_change()
+    beta = returns.rolling(window).cov(bench_returns) / \
+        bench_returns.rolling(window).var()
+    return pd.DataFrame({
+        'Close': bench,
+        'Beta': beta,
+        'Correlation': returns.rolling(window).corr(bench_returns),
+    })
+
+
+def rebase(bench, price):
+    """
+      Benchmark prices scaled to start at the price of the symbol.
+
+      Both series share one index. The first bar where both are known is
+      the common start, so the two lines compare their performance.
+
+    """
+    both = (bench.notna() & price.notna()).to_numpy().nonzero()[0]
+    if not len(both):
+        return bench * float('nan')
+    start = both[0]
+    return bench * (price.iloc[start] / bench.iloc[start])
@@ -0,0 +1,174 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import weakref
+import threading
+import logging as log
+from contextlib import contextmanager
+
+from cachetools import LRUCache
+from filelock import FileLock, Timeout
+
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+logger = log.getLogger(__name__)
+
+myvars = GlobVars()
+
+# A thread lock per key being fetched: the threads of a worker queue on it
+# instead of all polling the key's file lock
+_KEY_LOCKS = weakref.WeakValueDictionary()
+_KEY_LOCKS_LOCK = threading.Lock()
+
+
+def _digest(name):
+    return hashlib.sha1(name.encode('utf-8')).hexdigest()
+
+
+def _key_lock(digest):
+    with _KEY_LOCKS_LOCK:
+        lock = _KEY_LOCKS.get(digest)
+        if lock is None:
+            lock = _KEY_LOCKS[digest] = threading.Lock()
+        return lock
+
+
+# ---------------------------------- #
+#         STAMPEDE PROTECTION        #
+# ---------------------------------- #
+
+@contextmanager
+def fetch_lock(name, folder=None, wait=None):
+    """
+      Hold the fetch of a key, across threads and gunicorn workers.
+
+      The first caller fetches, the others wait for it here and then find
+      the value in the shared tier instead of asking the provider again. A
+      caller gives up waiting after `wait` seconds and goes on unlocked, so a
+      hung download does not block the app.
+
+      Parameters:
+        name (str): the key, e.g. 'ohlc:AAPL'
+        folder (str): (default: None) where the lock files are kept, the
+          'shared' folder of the cache directory if None
+        wait (float): (default: None) the most seconds to wait,
+          `fetchwait` in settings if None
+
+    """
+    folder = folder or os.path.join(myvars.cachedir, 'shared')
+    wait = myvars.fetchwait if wait is None else wait
+    digest = _digest(name)
+
+    os.makedirs(os.path.join(folder, 'locks'), exist_ok=True)
+    deadline = time.monotonic() + wait
+    lock = FileLock(os.path.join(folder, 'locks', digest[:16] + '.lock'))
+
+    # The thread lock is only held while taking the file lock, which then
+    # excludes the other threads as well as the other workers
+    key_lock = _key_lock(digest)
+    if key_lock.acquire(timeout=wait):
+        try:
+            lock.acquire(timeout=max(deadline - time.monotonic(), 0))
+        except Timeout:
+            lock = None
+        finally:
+            key_lock.release()
+    else:
+        lock = None
+
+    if lock is None:
+        logger.warning('Gave up waiting for the fetch of %s', name)
+    try:
+        yield
+    finally:
+        if lock is not None:
+            lock.release()
+
+
+# ---------------------------------- #
+#            SHARED CACHE            #
+# ---------------------------------- #
+
+class SharedCache:
+    """
+      Two-tier cache of values all the workers of a host want.
+
+      Each worker keeps the values it used in an LRU, behind it a SQLite file
+      in the cache directory is shared by every worker: a value one worker
+      fetched is a disk read for the others. Values are pickled and expire
+      `ttl` seconds after their fetch, in both tiers.
+
+    """
+
+    def __init__(self, namespace, ttl, maxsize=512, folder=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.folder = folder or os.path.join(myvars.cachedir, 'shared')
+        self.path = os.path.join(self.folder, 'cache.sqlite')
+        self._memory = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        # SQLite connections can't cross threads, nor a fork
+        self._local = threading.local()
+        os.makedirs(self.folder, exist_ok=True)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY '
+                         'KEY, expires REAL, value BLOB)')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _name(self, key):
+        return '{}:{}'.format(self.namespace, key)
+
+    def get(self, key, default=None):
+        """
+          A value from either tier, `default` if it is missing or expired.
+
+        """
+        name = self._name(key)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(name)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        try:
+            row = self._connection().execute(
+                'SELECT expires, value FROM cache WHERE key = ?',
+                (name,)).fetchone()
+        except sqlite3.Error:
+            logger.exception('Shared cache read failed for %s', name)
+            return default
+        if row is None or row[0] <= now:
+            return default
+
+        value = pickle.loads(row[1])
+        with self._lock:
+            self._memory[name] = (row[0], value)
+        return value
+
+    def set(self, key, value):
+        name = self._name(key)
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._memory[name] = (expires, value)
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+                             (name, expires, pickle.dumps(value, protocol=4)))
+                conn.execute('DELETE FROM cache WHERE expires < ?',
+                             (time.time(),))
+        except sqlite3.Error:
+            logger.exception('Shared cache write failed for %s', name)
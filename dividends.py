@@ -0,0 +1,157 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+# Fiscal years end in September, like the Federal one: FY19 runs from
+# October 2018 to September 2019
+FY_FIRST_MONTH = 10
+
+# Payments a year, by the longest usual gap (days) between two of them
+CADENCES = [(45, 'Monthly', 12), (120, 'Quarterly', 4),
+            (240, 'Semiannual', 2), (400, 'Annual', 1)]
+
+
+# ---------------------------------- #
+#         DIVIDEND ANALYTICS         #
+# ---------------------------------- #
+
+def fiscal_year(dates):
+    """
+      The fiscal year of each date, e.g. 2019 for 2018-10-01.
+
+    """
+    return dates.year + (dates.month >= FY_FIRST_MONTH)
+
+
+def cadence(dates):
+    """
+      How often a stock pays, from the gaps between its last payments.
+
+      Parameters:
+        dates (DatetimeIndex): the payment dates, sorted
+
+      Returns:
+        tuple: (name, payments a year), ('Irregular', 0) if unclear
+
+    """
+    if len(dates) < 2:
+        return 'Irregular', 0
+    gaps = np.diff(dates[-9:].to_numpy()) / np.timedelta64(1, 'D')
+    gap = np.median(gaps)
+    for longest, name, per_year in CADENCES:
+        if gap <= longest:
+            return name, per_year
+    return 'Irregular', 0
+
+
+def analyze(ohlc, today=None):
+    """
+      Dividend yields, growth and cadence of a price history.
+
+      Only the rows with a dividend are read, plus the last close: nothing
+      the size of the history is built.
+
+      Parameters:
+        ohlc (DataFrame): daily bars with 'Close' and 'Dividends', not
+          modified
+        today (date): (default: None) fiscal years ending after it are left
+          out as incomplete, the current date if None
+
+      Returns:
+        dict:
+          'events' (DataFrame): each payment's 'Dividends', 'Close' and
+            'Yield' (%), by date
+          'fiscal' (DataFrame): each complete fiscal year's 'DPS' (dividends
+            per share), 'Yield' (sum of the payments' yields, %), 'Growth'
+            of the DPS (%) and 'FYyy' label, indexed by the year's end
+          'ttm_dps', 'ttm_yield': the last twelve months' dividends and
+            their yield (%) on the last close
+          'cagr': yearly growth of the DPS (%) over the fiscal years, NaN
+            with less than two
+          'cadence', 'per_year': see cadence()
+
+    """
+    paid = np.flatnonzero(ohlc['Dividends'].to_numpy())
+    dates = ohlc.index[paid]
+    dps = ohlc['Dividends'].to_numpy()[paid]
+    close = ohlc['Close'].to_numpy()[paid]
+    events = pd.DataFrame({'Dividends': dps, 'Close': close,
+                           'Yield': 100 * dps / close}, index=dates)
+
+    # Every fiscal year from the first payment on, those without one too
+    years = fiscal_year(dates)
+    first = years.min() if len(years) else 0
+    slot = years - first
+    count = years.max() - first + 1 if len(years) else 0
+    fy = np.arange(first, first + count)
+    fiscal = pd.DataFrame({
+        'DPS': np.bincount(slot, weights=dps, minlength=count),
+        'Yield': np.bincount(slot, weights=events['Yield'].to_numpy(),
+                             minlength=count),
+    }, index=pd.to_datetime(['{}-09-30'.format(year) for year in fy]))
+    fiscal['FYyy'] = ['FY{:02d}'.format(year % 100) for year in fy]
+
+    # Only complete years: inside the history and over by today
+    today = pd.Timestamp(today or pd.Timestamp.today().date())
+    starts = fiscal.index - pd.DateOffset(years=1) + pd.Timedelta(days=1)
+    complete = (starts >= ohlc.index[0]) & (fiscal.index <= today) \
+        if len(ohlc) else np.zeros(len(fiscal), dtype=bool)
+    fiscal = fiscal[complete]
+    fiscal = fiscal.assign(Growth=100 * fiscal['DPS'].pct_change())
+
+    last = ohlc.index[-1] if len(ohlc) else today
+    ttm_dps = dps[dates > last - pd.DateOffset(years=1)].sum()
+    ttm_yield = 100 * ttm_dps / ohlc['Close'].iat[-1] if len(ohlc) \
+        else np.nan
+
+    # From the first to the last fiscal year with a dividend
+    fy_dps = fiscal['DPS'].to_numpy()
+    paying = np.flatnonzero(fy_dps)
+    span = paying[-1] - paying[0] if len(paying) else 0
+    growth = fy_dps[paying[-1]] / fy_dps[paying[0]] if span else np.nan
+    cagr = 100 * (growth ** (1 / span) - 1) if span else np.nan
+
+    name, per_year = cadence(dates)
+    return {'events': events, 'fiscal': fiscal, 'ttm_dps': ttm_dps,
+            'ttm_yield': ttm_yield, 'cagr': cagr, 'cadence': name,
+            'per_year': per_year}
+
+
+# ---------------------------------- #
+#              CACHING               #
+# ---------------------------------- #
+
+class DividendCache:
+    """
+      analyze() results by dataset handle ('SYMB@version', see framestore):
+      a symbol is analyzed again only when its data changes.
+
+    """
+
+    def __init__(self, maxsize=128):
+        self._results = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def get(self, handle, ohlc):
+        """
+          The dividends of a dataset, shared, do not modify them.
+
+        """
+        with self._lock:
+            result = self._results.get(handle)
+        if result is None:
+            result = analyze(ohlc)
+            with self._lock:
+                self._results[handle] = result
+        return result
+
+
+# Shared by the pages of a worker
+DIVIDENDS = DividendCache()
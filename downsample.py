@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+
+
+# ---------------------------------- #
+#            LINE TRACES             #
+# ---------------------------------- #
+
+def lttb(x, y, points):
+    """
+      Largest-Triangle-Three-Buckets: the points that best keep a line's shape.
+
+      Parameters:
+        x, y (ndarray): the line, x increasing, no NaN
+        points (int): how many points to keep
+
+      Returns:
+        ndarray: positions of the kept points, first and last included
+
+    """
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # points - 2 buckets between the first and last point
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    kept = np.empty(points, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # The third corner is the average of the next bucket
+        nhi = edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[hi:nhi].mean(), y[hi:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) -
+                      (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def minmax(x, y, points):
+    """
+      The lowest and highest point of every bucket, cheaper than lttb().
+
+      Parameters:
+        x, y (ndarray): the line, no NaN
+        points (int): about how many points to keep
+
+      Returns:
+        ndarray: positions of the kept points, in order
+
+    """
+    n = len(y)
+    if points >= n or points < 4:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=float)
+    starts = np.linspace(0, n, points // 2 + 1).astype(int)[:-1]
+    kept = [0, n - 1]
+    for lo, hi in zip(starts, np.append(starts[1:], n)):
+        kept += [lo + int(np.argmin(y[lo:hi])), lo + int(np.argmax(y[lo:hi]))]
+    return np.unique(kept)
+
+
+METHODS = {
+    'lttb': lttb,
+    'minmax': minmax,
+}
+
+
+def thin(dates, values, points, method='lttb'):
+    """
+      Positions of a date-indexed line to plot, its missing values left out.
+
+      Parameters:
+        dates (DatetimeIndex): x of the line
+        values (ndarray): y of the line, may hold NaN (e.g. warm-up bars of a
+          moving average)
+        points (int): how many points to keep at most
+        method (str): (default: 'lttb') a key of METHODS
+
+      Returns:
+        ndarray: positions into `values`
+
+    """
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) <= points:
+        return valid
+    x = dates.asi8[valid]
+    return valid[METHODS[method](x, values[valid], points)]
+
+
+# ---------------------------------- #
+#           BAR AGGREGATES           #
+# ---------------------------------- #
+
+def ohlc_buckets(df, points):
+    """
+      Merge consecutive bars into at most `points` bars.
+
+      Each bucket opens at its first bar's Open and date, closes at its last
+      Close, and spans the highest High and lowest Low. Volume is the average
+      per bar, so that it stays on the scale of a volume moving average.
+
+      Parameters:
+        df (DataFrame): date-indexed bars with Open, High, Low, Close, Volume
+        points (int): how many bars to keep at most
+
+      Returns:
+        DataFrame: the merged bars, `df` itself when it is short enough
+
+    """
+    n = len(df)
+    if n <= points:
+        return df
+
+    starts = np.unique(np.linspace(0, n, points + 1).astype(int)[:-1])
+    ends = np.append(starts[1:], n) - 1
+    high = df['High'].to_numpy(dtype=float)
+    low = df['Low'].to_numpy(dtype=float)
+    volume = np.nan_to_num(df['Volume'].to_numpy(dtype=float))
+
+    return pd.DataFrame({
+        'Open': df['Open'].to_numpy()[starts],
+        'High': np.fmax.reduceat(high, starts),
+        'Low': np.fmin.reduceat(low, starts),
+        'Close': df['Close'].to_numpy()[ends],
+        'Volume': np.add.reduceat(volume, starts) / (ends - starts + 1),
+    }, index=df.index[starts])
+
+
+def parse_xrange(relayout):
+    """
+      The x-axis range of a Graph's relayoutData.
+
+      Returns:
+        tuple: (start, end) Timestamps for a zoom or pan, () when the axis
+          went back to autorange, None when the x-axis did not change
+
+    """
+    relayout = relayout or {}
+    if relayout.get('xaxis.autorange'):
+        return ()
+    if 'xaxis.range' in relayout:
+        start, end = relayout['xaxis.range'][:2]
+    elif 'xaxis.range[0]' in relayout and 'xaxis.range[1]' in relayout:
+        start, end = relayout['xaxis.range[0]'], relayout['xaxis.range[1]']
+    else:
+        return None
+    try:
+        return pd.Timestamp(start), pd.Timestamp(end)
+    except (TypeError, ValueError):
+        return None
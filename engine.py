@@ -0,0 +1,462 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import indicators as idc
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+# Default parameters of every strategy on the backtest page
+STRATEGIES = {
+    'BH': {},
+    'DCA': {'freq': 'M'},
+    'BLSH': {'window': 20, 'low': 0.2, 'high': 0.8},
+    'MAC': {'fast': 50, 'slow': 200},
+    'RSI': {'window': 14, 'low': 30, 'high': 70},
+    'BBC': {'window': 20, 'width': 2.},
+}
+
+SIZING_RULES = ['Flat', 'Kelly']
+
+# Bars per year, used to annualize returns and volatility
+PERIODS = {'D': 252, 'W': 52, 'M': 12, 'Q': 4, 'Y': 1,
+           '1h': 252 * 7, '5m': 252 * 78, '1m': 252 * 390}
+
+BacktestResult = namedtuple('BacktestResult', ['ledger', 'fills', 'stats'])
+
+
+# ---------------------------------- #
+#             INDICATORS             #
+# ---------------------------------- #
+
+INDICATORS = idc.FUNCTIONS
+
+# Indicators each strategy reads, and the parameter holding their window
+NEEDS = {
+    'BLSH': [('min', 'window'), ('max', 'window')],
+    'MAC': [('sma', 'fast'), ('sma', 'slow')],
+    'RSI': [('rsi', 'window')],
+    'BBC': [('sma', 'window'), ('std', 'window')],
+}
+
+
+def indicator(price, name, window, bank=None):
+    """
+      An indicator of INDICATORS, looked up in `bank` first.
+
+      Parameters:
+        price (Series/DataFrame): the price field
+        name (str): a key of INDICATORS
+        window (int): look-back in bars
+        bank (dict/Memo): (default: None) indicators already computed on
+          this price, keyed by (name, window). New ones are added to it.
+          An indicators.Memo goes through the shared indicator cache.
+
+    """
+    if isinstance(bank, idc.Memo):
+        return bank.get(price, name, window)
+    key = (name, window)
+    if bank is not None and key in bank:
+        return bank[key]
+    value = INDICATORS[name](price, window)
+    if bank is not None:
+        bank[key] = value
+    return value
+
+
+def bollinger(price, window, width, bank=None):
+    mid = indicator(price, 'sma', window, bank)
+    band = width * indicator(price, 'std', window, bank)
+    return mid - band, mid + band
+
+
+# ---------------------------------- #
+#              SIGNALS               #
+# ---------------------------------- #
+
+def _hold(enter, leave):
+    """
+      Long/flat state from entry and exit conditions.
+
+      A bar that is neither an entry nor an exit keeps the previous state.
+
+    """
+    signal = enter.astype(float).where(enter | leave)
+    return signal.ffill().fillna(0.)
+
+
+def signals(price, strategy, bank=None, **params):
+    """
+      Target state of each bar: 1 to be long, 0 to be flat.
+
+      Parameters:
+        price (Series/DataFrame): the price field the strategy looks at
+        strategy (str): a key of STRATEGIES, except 'DCA'
+        bank (dict): (default: None) shared indicators, see indicator()
+        params: overrides of the strategy's default parameters
+
+      Returns:
+        Series/DataFrame: the state decided at the close of each bar
+
+    """
+    params = dict(STRATEGIES[strategy], **params)
+
+    if strategy == 'BH':
+        return price.notna().astype(float)
+
+    elif strategy == 'BLSH':
+        # Buy in the bottom of the recent range, sell at the top of it
+        low = indicator(price, 'min', params['window'], bank)
+        high = indicator(price, 'max', params['window'], bank)
+        where = (price - low) / (high - low)
+        return _hold(where <= params['low'], where >= params['high'])
+
+    elif strategy == 'MAC':
+        fast = indicator(price, 'sma', params['fast'], bank)
+        slow = indicator(price, 'sma', params['slow'], bank)
+        return (fast > slow).astype(float)
+
+    elif strategy == 'RSI':
+        strength = indicator(price, 'rsi', params['window'], bank)
+        return _hold(strength < params['low'], strength > params['high'])
+
+    elif strategy == 'BBC':
+        lower, upper = bollinger(price, params['window'], params['width'],
+                                 bank)
+        return _hold(price < lower, price > upper)
+
+    raise ValueError('No signal for strategy: {}'.format(strategy))
+
+
+def kelly_fraction(close, lookback=252):
+    """
+      Kelly fraction mu/sigma^2 of the trailing returns, capped to [0, 1].
+
+      Only bars up to the decision are used, so there is no look-ahead. The
+      fraction is NaN until 20 returns are available.
+
+    """
+    returns = close.pct_change()
+    mean = returns.rolling(lookback, min_periods=20).mean()
+    var = returns.rolling(lookback, min_periods=20).var()
+    return (mean / var).clip(0., 1.)
+
+
+def target_weights(ohlc, strategy, sizing='Flat', field='Close', bank=None,
+                   **params):
+    """
+      Fraction of the equity each bar's close asks to hold.
+
+    """
+    state = signals(ohlc[field], strategy, bank, **params)
+    if sizing == 'Kelly':
+        # Sized once in a trade and kept through it. Until the fraction is
+        # positive (not enough returns yet, or a losing stretch) the trade
+        # stays unsized and is tried again at the next bar.
+        if not isinstance(bank, dict) or 'kelly' not in bank:
+            fraction = kelly_fraction(ohlc['Close'])
+        else:
+            fraction = bank['kelly']
+        held = state > 0
+        start = held & (state.shift() != 1)
+        sizable = held & (fraction > 0)
+        # Sizable bars so far, and before the trade began
+        count = sizable.cumsum()
+        before = (count - sizable).where(start).ffill().fillna(0)
+        sized = sizable & (count - before == 1)
+        # Carried from the sizing bar, zero out of a trade or before sizing
+        size = fraction.where(sized).mask(~sized & (start | ~held), 0.)
+        return state * size.ffill().fillna(0.)
+    return state
+
+
+# ---------------------------------- #
+#              SIMULATION            #
+# ---------------------------------- #
+
+def _last_index(mask):
+    """
+      For every row, the index of the latest row (inclusive) where mask holds.
+
+    """
+    rows = np.arange(mask.shape[0]).reshape((-1,) + (1,) * (mask.ndim - 1))
+    return np.maximum.accumulate(np.where(mask, rows, 0), axis=0)
+
+
+def simulate(open_, close, weights, balance=10000., fee=0.):
+    """
+      Equity of a long-only book that trades at the next bar's open.
+
+      The weight decided at the close of bar t is reached at the open of
+      bar t+1 and the shares are then held untouched until the weight
+      changes again. Everything is computed with cumulative array operations,
+      there is no loop over the bars.
+
+      Parameters:
+        open_, close (ndarray): prices, shape (bars,) or (bars, symbols)
+        weights (ndarray): target weights, same shape as the prices
+        balance (float): (default: 10000.) starting cash
+        fee (float): (default: 0.) cost as a fraction of the traded value
+
+      Returns:
+        dict: 'weight', 'shares', 'cash' and 'equity' arrays, and 'trade'
+          the boolean mask of the bars where a fill happens.
+
+    """
+    weights = np.nan_to_num(np.asarray(weights, dtype=float))
+    # Weight held during each bar, nothing is held on the first one
+    held = np.zeros_like(weights)
+    held[1:] = weights[:-1]
+
+    prev = np.zeros_like(held)
+    prev[1:] = held[:-1]
+    trade = held != prev
+    start = trade.copy()
+    start[0] = True
+
+    # Open price when the running position was put on
+    anchor = _last_index(start)
+    cols = np.indices(anchor.shape)[1:]
+    entry = open_[(anchor,) + tuple(cols)]
+    prev_entry = np.empty_like(entry)
+    prev_entry[0] = open_[0]
+    prev_entry[1:] = entry[:-1]
+
+    # The equity only compounds when a position is closed or resized
+    growth = np.where(trade, 1. + prev * (open_ / prev_entry - 1.), 1.)
+    growth *= np.where(trade, 1. - fee * np.abs(held - prev), 1.)
+    base = balance * np.cumprod(growth, axis=0)
+
+    shares = held * base / entry
+    cash = base * (1. - held)
+    equity = cash + shares * close
+    return {'weight': held, 'shares': shares, 'cash': cash,
+            'equity': equity, 'trade': trade}
+
+
+def simulate_dca(open_, close, dates, balance=10000., freq='M', mask=None):
+    """
+      Dollar cost averaging: the balance is invested in equal parts at the
+      open of the first bar of every period.
+
+      `mask`, for a panel, tells where a symbol has a bar to buy on.
+
+    """
+    period = pd.DatetimeIndex(dates).to_period(freq).to_numpy()
+    first = np.ones(len(period), dtype=bool)
+    first[1:] = period[1:] != period[:-1]
+    # One column per symbol when the prices are a panel
+    trade = np.broadcast_to(first.reshape((-1,) + (1,) * (open_.ndim - 1)),
+                            open_.shape)
+    if mask is not None:
+        trade = trade & mask
+    amount = balance / np.maximum(trade.sum(axis=0), 1)
+
+    shares = np.cumsum(np.where(trade, amount / open_, 0.), axis=0)
+    cash = balance - amount * np.cumsum(trade, axis=0)
+    equity = cash + shares * close
+    weight = shares * close / equity
+    return {'weight': weight, 'shares': shares, 'cash': cash,
+            'equity': equity, 'trade': trade}
+
+
+def performance(equity, periods=252):
+    """
+      Summary statistics of an equity curve.
+
+      Parameters:
+        equity (ndarray): equity per bar, shape (bars,) or (bars, n)
+        periods (int): (default: 252) bars per year
+
+      Returns:
+        dict: 'return', 'cagr', 'volatility', 'sharpe' and 'drawdown', as
+          floats (or arrays of n values).
+
+    """
+    equity = np.asarray(equity, dtype=float)
+    returns = equity[1:] / equity[:-1] - 1.
+    years = max(len(equity) - 1, 1) / periods
+
+    total = equity[-1] / equity[0] - 1.
+    cagr = (equity[-1] / equity[0]) ** (1. / years) - 1.
+    vol = returns.std(axis=0, ddof=1) * np.sqrt(periods)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(vol > 0,
+                          returns.mean(axis=0) * periods / vol, 0.)
+    drawdown = (equity / np.maximum.accumulate(equity, axis=0) - 1.).min(axis=0)
+
+    return {'return': total, 'cagr': cagr, 'volatility': vol,
+            'sharpe': sharpe[()], 'drawdown': drawdown}
+
+
+def versus(ledger):
+    """
+      Beta and correlation of the equity's bar returns to the benchmark's.
+
+      Parameters:
+        ledger (DataFrame): with 'Equity' and 'Benchmark' columns
+
+      Returns:
+        dict: 'beta' and 'correlation', NaN without enough bars
+
+    """
+    returns = ledger[['Equity', 'Benchmark']].pct_change()
+    variance = returns['Benchmark'].var()
+    beta = returns['Equity'].cov(returns['Benchmark']) / variance \
+        if variance > 0 else np.nan
+    return {'beta': beta,
+            'correlation': returns['Equity'].corr(returns['Benchmark'])}
+
+
+# ---------------------------------- #
+#              BACKTEST              #
+# ---------------------------------- #
+
+def run(ohlc, strategy, sizing='Flat', balance=10000., field='Close',
+        interval='D', benchmark=None, fee=0., symb=None, **params):
+    """
+      Backtest one strategy on one symbol.
+
+      Parameters:
+        ohlc (DataFrame): bars with at least Open, Close and `field`
+        strategy (str): a key of STRATEGIES
+        sizing (str): (default: 'Flat') 'Flat' is all-in when long, 'Kelly'
+          holds the Kelly fraction of the equity. Ignored by 'DCA'.
+        balance (float): (default: 10000.) starting cash
+        field (str): (default: 'Close') price field the signals look at
+        interval (str): (default: 'D') bar size, a key of PERIODS
+        benchmark (Series): (default: None) closing prices of a reference
+          index, bought and held with the same balance
+        fee (float): (default: 0.) cost as a fraction of the traded value
+        symb (str): (default: None) the symbol, its indicators then come
+          from the shared cache the charts use too
+        params: overrides of the strategy's default parameters
+
+      Returns:
+        BacktestResult: 'ledger' frame (Signal, Weight, Shares, Cash,
+          Equity and Benchmark per bar), 'fills' frame (Side, Price, Shares)
+          and 'stats' dict.
+
+    """
+    ohlc = ohlc.dropna(subset=['Open', 'Close'])
+    open_ = ohlc['Open'].to_numpy(dtype=float)
+    close = ohlc['Close'].to_numpy(dtype=float)
+
+    if strategy == 'DCA':
+        signal = pd.Series(1., index=ohlc.index)
+        book = simulate_dca(open_, close, ohlc.index, balance,
+                            **dict(STRATEGIES['DCA'], **params))
+    else:
+        bank = idc.Memo(symb, interval, field) if symb else None
+        signal = signals(ohlc[field], strategy, bank, **params)
+        weights = target_weights(ohlc, strategy, sizing, field, bank,
+                                 **params)
+        book = simulate(open_, close, weights.to_numpy(), balance, fee)
+
+    ledger = pd.DataFrame({
+        'Signal': signal.to_numpy(),
+        'Weight': book['weight'],
+        'Shares': book['shares'],
+        'Cash': book['cash'],
+        'Equity': book['equity'],
+    }, index=ohlc.index)
+
+    if benchmark is not None:
+        bench = benchmark.reindex(ohlc.index).ffill().bfill()
+        ledger['Benchmark'] = balance * bench / bench.iloc[0]
+
+    traded = np.diff(np.concatenate([[0.], book['shares']]))
+    fills = pd.DataFrame({
+        'Side': np.where(traded > 0, 'BUY', 'SELL'),
+        'Price': open_,
+        'Shares': np.abs(traded),
+    }, index=ohlc.index)[book['trade']]
+
+    stats = performance(book['equity'], PERIODS.get(interval, 252))
+    stats['trades'] = len(fills)
+    stats['exposure'] = float((book['weight'] > 0).mean())
+    if benchmark is not None:
+        stats['benchmark'] = ledger['Benchmark'].iloc[-1] / balance - 1.
+        stats.update(versus(ledger))
+
+    return BacktestResult(ledger, fills, stats)
+
+
+def run_portfolio(panel, strategy, sizing='Flat', balance=10000.,
+                  field='Close', interval='D', benchmark=None, fee=0.,
+                  **params):
+    """
+      Backtest one strategy on every symbol of a price panel at once.
+
+      The balance is split in equal sleeves, one per symbol, and each sleeve
+      follows the strategy on its own symbol. Signals, sizing and the
+      simulation run over the whole (dates x symbols) arrays in one pass.
+
+      Parameters:
+        panel (PricePanel): aligned prices, see panel.py
+        strategy, sizing, balance, field, interval, benchmark, fee, params:
+          as in run()
+
+      Returns:
+        BacktestResult: the portfolio 'ledger' (Weight, Cash, Equity and
+          Benchmark), the 'fills' of every symbol (Symbol, Side, Price,
+          Shares) and 'stats', where stats['symbols'] is a frame with the
+          performance of each sleeve.
+
+    """
+    sleeve = balance / len(panel.symbols)
+    open_ = panel.data['Open']
+    close = panel.data['Close']
+
+    if strategy == 'DCA':
+        book = simulate_dca(open_, close, panel.index, sleeve,
+                            mask=panel.mask,
+                            **dict(STRATEGIES['DCA'], **params))
+    else:
+        frames = {'Close': panel['Close'], field: panel[field]}
+        weights = target_weights(frames, strategy, sizing, field, **params)
+        # No trading on a missing bar, and nothing held outside the listing
+        weights = weights.where(panel.mask).ffill().to_numpy()
+        listed = np.maximum.accumulate(panel.mask, axis=0) & \
+            np.maximum.accumulate(panel.mask[::-1], axis=0)[::-1]
+        book = simulate(open_, close, np.where(listed, weights, 0.),
+                        sleeve, fee)
+
+    equity = book['equity'].sum(axis=1)
+    ledger = pd.DataFrame({
+        'Weight': (book['shares'] * close).sum(axis=1) / equity,
+        'Cash': book['cash'].sum(axis=1),
+        'Equity': equity,
+    }, index=panel.index)
+
+    if benchmark is not None:
+        bench = benchmark.reindex(panel.index).ffill().bfill()
+        ledger['Benchmark'] = balance * bench / bench.iloc[0]
+
+    traded = np.diff(np.vstack([np.zeros((1, len(panel.symbols))),
+                                book['shares']]), axis=0)
+    rows, cols = np.nonzero(book['trade'])
+    fills = pd.DataFrame({
+        'Symbol': np.asarray(panel.symbols)[cols],
+        'Side': np.where(traded[rows, cols] > 0, 'BUY', 'SELL'),
+        'Price': open_[rows, cols],
+        'Shares': np.abs(traded[rows, cols]),
+    }, index=panel.index[rows])
+
+    periods = PERIODS.get(interval, 252)
+    stats = performance(equity, periods)
+    stats['trades'] = len(fills)
+    stats['exposure'] = float((ledger['Weight'] > 0).mean())
+    if benchmark is not None:
+        stats['benchmark'] = ledger['Benchmark'].iloc[-1] / balance - 1.
+        stats.update(versus(ledger))
+
+    by_symbol = performance(book['equity'], periods)
+    stats['symbols'] = pd.DataFrame(by_symbol, index=panel.symbols)
+    stats['symbols']['trades'] = book['trade'].sum(axis=0)
+
+    return BacktestResult(ledger, fills, stats)
@@ -0,0 +1,84 @@
+import base64
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+# Shorter arrays stay plain JSON, encoding them would not pay off
+MIN_LENGTH = 64
+
+
+# ---------------------------------- #
+#          FIGURE ENCODING           #
+# ---------------------------------- #
+
+def _numbers(values):
+    # The array as float64, dates as milliseconds since the epoch; None if
+    # it holds anything else (e.g. hover text)
+    if values.dtype.kind in 'fiub':
+        return values.astype(float), False
+    if values.dtype.kind == 'M' or values.dtype.kind == 'O' and \
+            isinstance(values[0], (dt.date, np.datetime64)):
+        ms = pd.to_datetime(values).to_numpy().astype('datetime64[ms]')
+        return ms.astype('int64').astype(float), True
+    return None, False
+
+
+def encode(figure):
+    """
+      A figure with its long arrays pooled and its numbers in binary.
+
+      The arrays of the traces move to a list 'arrays' and the traces refer
+      to them as {'pooled': position}, an array repeated across traces (e.g.
+      the dates) is sent once. Numbers and dates are sent as base64 float64
+      ({'bdata': ...}), a fraction of their decimal text and much faster to
+      write. assets/clientside.js turns them back into typed arrays.
+
+      Parameters:
+        figure (dict): a Figure.to_dict(), not modified
+
+      Returns:
+        dict: 'data', 'layout' and 'arrays', for dcc.Store
+
+    """
+    arrays, pooled = [], {}
+    dates = False
+
+    def pool(key, spec):
+        if key not in pooled:
+            pooled[key] = len(arrays)
+            arrays.append(spec)
+        return {'pooled': pooled[key]}
+
+    data = []
+    for trace in figure['data']:
+        trace = dict(trace)
+        for name, value in trace.items():
+            if not isinstance(value, (list, tuple, np.ndarray)) or \
+                    len(value) < MIN_LENGTH:
+                continue
+            values = np.asarray(value)
+            if values.ndim != 1:
+                continue
+
+            numbers, is_date = _numbers(values)
+            if numbers is not None:
+                raw = numbers.astype('<f8').tobytes()
+                trace[name] = pool(raw, {
+                    'bdata': base64.b64encode(raw).decode('ascii')})
+                dates = dates or is_date and name == 'x'
+            elif isinstance(value[0], str):
+                values = list(value)
+                trace[name] = pool(tuple(values), {'values': values})
+        data.append(trace)
+
+    layout = dict(figure.get('layout', {}))
+    if dates:
+        # Numbers on an axis are only read as dates if it says so
+        layout['xaxis'] = dict(layout.get('xaxis', {}), type='date')
+    return {'data': data, 'layout': layout, 'arrays': arrays}
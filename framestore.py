@@ -0,0 +1,173 @@
+import os
+import glob
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+myvars = GlobVars()
+
+
+def data_version(df):
+    """
+      Content hash of a frame, identical in every worker for the same data.
+
+      Parameters:
+        df (DataFrame): any frame
+
+      Returns:
+        str: 12 hex digits
+
+    """
+    hashed = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    return hashlib.sha1(hashed.tobytes()).hexdigest()[:12]
+
+
+def write_atomic(path, write):
+    """
+      Write a file under a temporary name of its own, then move it in place.
+
+      Readers never see a file half written, and concurrent writers of the
+      same path each move a complete file in.
+
+      Parameters:
+        path (str): the file
+        write (callable): write(tmp) writes the content to the path tmp
+
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp)
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            # Windows won't replace a file in use, another writer got there
+            # first
+            if not os.path.exists(path):
+                raise
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def make_handle(symb, version):
+    return '{}@{}'.format(symb.upper(), version)
+
+
+def split_handle(handle):
+    symb, version = handle.rsplit('@', 1)
+    return symb, version
+
+
+# ---------------------------------- #
+#             FRAME STORE            #
+# ---------------------------------- #
+
+class FrameStore:
+    """
+      Server-side home of the datasets the callbacks share.
+
+      A frame is stored once under a small handle 'SYMB@version' which is all
+      the browser carries around. Each worker keeps the frames it has used in
+      an LRU capped at `capacity` bytes, backed by uncompressed Feather files
+      that any worker can memory-map. Frames handed out are shared, callers
+      must treat them as read-only.
+
+    """
+
+    def __init__(self, folder=None, capacity=None, keep=2):
+        self.folder = folder or os.path.join(myvars.cachedir, 'frames')
+        self.capacity = myvars.framecap if capacity is None else capacity
+        # Versions of a symbol kept on disk, older ones are deleted
+        self.keep = keep
+        self.nbytes = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.folder, exist_ok=True)
+
+    def path(self, handle):
+        return os.path.join(self.folder, handle + '.feather')
+
+    def put(self, symb, df):
+        """
+          Store a frame and return its handle.
+
+          Parameters:
+            symb (str): ticker symbol the data belongs to
+            df (DataFrame): the dataset, not to be modified afterwards
+
+          Returns:
+            str: handle of the form 'SYMB@version'
+
+        """
+        handle = make_handle(symb, data_version(df))
+        with self._lock:
+            if handle in self._frames:
+                self._frames.move_to_end(handle)
+                return handle
+
+        path = self.path(handle)
+        if not os.path.exists(path):
+            table = pa.Table.from_pandas(df)
+            write_atomic(path, lambda tmp: feather.write_feather(
+                table, tmp, compression='uncompressed'))
+            self.prune(symb)
+
+        self._remember(handle, df)
+        return handle
+
+    def get(self, handle):
+        """
+          The frame behind a handle, from memory or the shared folder.
+
+          Raises:
+            KeyError: the handle is unknown, e.g. its file was pruned
+
+        """
+        with self._lock:
+            if handle in self._frames:
+                self._frames.move_to_end(handle)
+                return self._frames[handle]
+
+        try:
+            table = feather.read_table(self.path(handle), memory_map=True)
+        except (OSError, pa.ArrowInvalid):
+            raise KeyError(handle)
+
+        # Columns without nulls are views on the mapped file, no copy made
+        df = table.to_pandas(split_blocks=True)
+        self._remember(handle, df)
+        return df
+
+    def prune(self, symb):
+        files = glob.glob(os.path.join(self.folder, symb.upper() + '@*.feather'))
+        files.sort(key=os.path.getmtime)
+        for path in files[:-self.keep]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _remember(self, handle, df):
+        size = int(df.memory_usage(index=True).sum())
+        with self._lock:
+            if handle in self._frames:
+                return
+            self._frames[handle] = df
+            self.nbytes += size
+            # Evict the least recently used, always keep the newest one
+            while self.nbytes > self.capacity and len(self._frames) > 1:
+                _, old = self._frames.popitem(last=False)
+                self.nbytes -= int(old.memory_usage(index=True).sum())
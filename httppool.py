@@ -0,0 +1,90 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+myvars = GlobVars()
+
+# Yahoo! turns away the default python-requests agent
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+                  'AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/85.0.4183.102 Safari/537.36',
+}
+
+
+# ---------------------------------- #
+#           POOLED SESSIONS          #
+# ---------------------------------- #
+
+class TimeoutAdapter(HTTPAdapter):
+    """
+      Connection pool that gives every request a default timeout.
+
+    """
+
+    def __init__(self, timeout, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def make_session(size=None, timeout=None):
+    """
+      A requests session keeping its connections alive.
+
+      Parameters:
+        size (int): (default: None) connections kept per host, `httppool`
+          in settings if None
+        timeout (float): (default: None) seconds before a request fails,
+          `httptimeout` in settings if None
+
+      Returns:
+        Session: retries busy or failing servers with a backoff
+
+    """
+    size = size or myvars.httppool
+    adapter = TimeoutAdapter(
+        timeout or myvars.httptimeout,
+        pool_connections=size, pool_maxsize=size,
+        max_retries=Retry(total=3, backoff_factor=0.3,
+                          status_forcelist=[429, 500, 502, 503, 504]),
+    )
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_lock = threading.Lock()
+_sessions = {}
+
+
+def session():
+    """
+      The session all the upstream requests of this worker share.
+
+      A worker forked after its creation gets a new one, sockets must not
+      be shared between processes.
+
+    """
+    pid = os.getpid()
+    with _lock:
+        if pid not in _sessions:
+            _sessions.clear()
+            _sessions[pid] = make_session()
+        return _sessions[pid]
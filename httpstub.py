@@ -0,0 +1,231 @@
+import json
+import time
+import zlib
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+
+import httppool
+import prefetch
+import profiles
+import providers as pvd
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+# Seconds the stub takes to accept a connection and to answer a request,
+# about what a TLS handshake and a Yahoo! request cost
+HANDSHAKE = 0.05
+LATENCY = 0.2
+
+
+# ---------------------------------- #
+#          STUB DATA SERVER          #
+# ---------------------------------- #
+
+def stub_bars(symb, start, end):
+    """
+      Made-up daily bars of a symbol, the same on every call.
+
+    """
+    dates = pd.bdate_range(start, end, name='Date')
+    random = np.random.RandomState(zlib.crc32(symb.encode('utf-8')))
+    close = 100 * np.exp(np.cumsum(random.normal(0, 0.01, len(dates))))
+    return pd.DataFrame({'Open': close, 'High': close * 1.01,
+                         'Low': close * 0.99, 'Close': close,
+                         'Volume': random.randint(10**5, 10**6, len(dates))},
+                        index=dates)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, and whole responses in one write (a small buffer meets
+    # Nagle's algorithm and delayed ACKs, 40 ms a request)
+    protocol_version = 'HTTP/1.1'
+    wbufsize = 65536
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+        time.sleep(self.server.handshake)
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        kind, _, symb = url.path.strip('/').partition('/')
+
+        if kind == 'history':
+            bars = stub_bars(symb, query['start'], query['end'])
+            body = bars.to_json(orient='split', date_format='iso')
+        elif kind == 'profile':
+            body = json.dumps({module: {'symbol': symb}
+                               for module in query['modules'].split(',')})
+        else:
+            self.send_error(404)
+            return
+
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer:
+    """
+      Local HTTP server standing in for Yahoo! in tests and timings.
+
+      It serves made-up daily bars on /history/<SYMB>?start=&end= and
+      profile modules on /profile/<SYMB>?modules=, after `latency` seconds.
+      Each new connection costs `handshake` seconds and is counted in
+      `connections`, what connection pooling saves shows there.
+
+      Use it as a context manager:
+
+        with StubServer() as server:
+            requests.get(server.url + '/history/AAPL?start=...&end=...')
+
+    """
+
+    def __init__(self, latency=LATENCY, handshake=HANDSHAKE):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.latency = latency
+        self._server.handshake = handshake
+        self._server.connections = 0
+        self.url = 'http://127.0.0.1:{}'.format(self._server.server_port)
+
+    @property
+    def connections(self):
+        return self._server.connections
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever,
+                         daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class StubProvider(pvd.Provider):
+    """
+      Daily bars from a StubServer, through the pooled session.
+
+    """
+    name = 'stub'
+
+    def __init__(self, url):
+        self.url = url
+
+    def history(self, symb, start, end=None):
+        end = end or pd.Timestamp.today().date()
+        answer = httppool.session().get(
+            '{}/history/{}'.format(self.url, symb),
+            params={'start': str(start), 'end': str(end)})
+        answer.raise_for_status()
+        return pvd.conform(pd.read_json(answer.text, orient='split'))
+
+
+class StubProfiles(profiles.ProfileService):
+    """
+      Profile modules from a StubServer, cached as the real ones are.
+
+    """
+
+    def __init__(self, url, folder=None):
+        super().__init__(folder=folder)
+        self.url = url
+
+    def _fetch(self, symb):
+        stale = [module for module, shared in self._caches.items()
+                 if shared.get(symb) is None]
+        if not stale:
+            return {}
+        answer = httppool.session().get(
+            '{}/profile/{}'.format(self.url, symb),
+            params={'modules': ','.join(stale)})
+        answer.raise_for_status()
+        data = answer.json()
+        for module in stale:
+            self._caches[module].set(symb, data[module])
+        return data
+
+
+# ---------------------------------- #
+#              TIMINGS               #
+# ---------------------------------- #
+
+def time_sessions(server, calls=20):
+    """
+      Seconds for `calls` requests with a new session each, then with the
+      pooled session.
+
+      Returns:
+        dict: 'fresh' and 'pooled', each (seconds, connections opened)
+
+    """
+    timings = {}
+    for name, session in [('fresh', requests.Session),
+                          ('pooled', httppool.session)]:
+        opened = server.connections
+        started = time.perf_counter()
+        for _ in range(calls):
+            session().get(server.url + '/profile/AAPL',
+                          params={'modules': 'quoteType'}).json()
+        timings[name] = (time.perf_counter() - started,
+                         server.connections - opened)
+    return timings
+
+
+def time_fetch(server, symb='AAPL'):
+    """
+      Seconds to fetch a symbol's bars and profile one after the other,
+      then concurrently with prefetch.fetch(). Each run starts from empty
+      caches.
+
+      Returns:
+        dict: 'serial' and 'concurrent' seconds
+
+    """
+    timings = {}
+    for name in ['serial', 'concurrent']:
+        folder = tempfile.mkdtemp()
+        try:
+            store = pvd.OHLCStore(StubProvider(server.url), folder=folder)
+            service = StubProfiles(server.url, folder=folder)
+            started = time.perf_counter()
+            if name == 'serial':
+                store.history(symb)
+                for attribute in profiles.MODULES:
+                    service.get(symb, attribute)
+            else:
+                prefetch.fetch(symb, store, service)
+            timings[name] = time.perf_counter() - started
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+    return timings
+
+
+if __name__ == '__main__':
+    # Quick answers, so that the connections' cost shows
+    with StubServer(latency=0.01) as server:
+        for name, (seconds, opened) in time_sessions(server).items():
+            print('{:<10} {:.2f}s, {} connections'.format(name, seconds,
+                                                          opened))
+    with StubServer() as server:
+        for name, seconds in time_fetch(server).items():
+            print('{:<10} {:.2f}s'.format(name, seconds))
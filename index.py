@@ -1,24 +1,66 @@
+import time
+STARTED = time.perf_counter()
+
+import importlib
+import logging as log
+
 import dash
 import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State
 import dash_core_components as dcc
 import dash_html_components as html
 
-# For encoding local images
-import base64
-
 # declaring the layout and server etc
 from main import app, server
+import metrics as mx
+
+
+# ---------------------------------- #
+#            PAGE REGISTRY           #
+# ---------------------------------- #
+
+logger = log.getLogger(__name__)
+
+# Route of each page and the module holding its layout and callbacks,
+# the first one is the home page
+PAGES = {
+    '/research': 'apps.research',
+    '/backtest': 'apps.backtest',
+    # Internal, not in the navigation bar
+    '/admin': 'apps.admin',
+}
+
+# Seconds spent importing, served on /metrics and shown on /admin
+TIMINGS = mx.STARTUP
+
+
+def load_pages():
+    """
+      Import the page modules, with their data and plotting libraries.
+
+      This is left to the worker's first request so that it boots with Dash
+      alone. The pages can't wait for their route: the browser reads the
+      callbacks of every page when the app loads, they must be registered by
+      then.
+
+    """
+    for module in PAGES.values():
+        started = time.perf_counter()
+        importlib.import_module(module)
+        TIMINGS[module] = time.perf_counter() - started
+        logger.info('%s loaded in %.2fs', module, TIMINGS[module])
+
+
+# Run before Dash's own setup, which collects the scripts of the component
+# libraries the pages import (e.g. dash_table)
+server.before_first_request_funcs.insert(0, load_pages)
 
-# import all pages in the app
-from apps import backtest, research
 
 # ---------------------------------- #
 #         GLOBAL COMPONENTS          #
 # ---------------------------------- #
 
 # Navigation Bar
-LOGO_IMAGE = base64.b64encode(open('./assets/logo.png', 'rb').read())
 navbar = dbc.Navbar(
     dbc.Container(
         [
@@ -85,17 +127,15 @@ app.layout = html.Div([
     [Input('url', 'pathname')]
     )
 def display_page(pathname):
-    if pathname == '/research':
-        return research.layout
-    elif pathname == '/backtest':
-        return backtest.layout
-    # elif pathname == '/economy':
-    #     return economy.layout
-    # elif pathname == '/contact':
-    #     return contact.layout
-    else:
-        return research.layout
+    # '/economy' and '/contact' are to come, unknown routes get the home page
+    module = PAGES.get(pathname, next(iter(PAGES.values())))
+    return importlib.import_module(module).layout
+
+TIMINGS['startup'] = time.perf_counter() - STARTED
+logger.info('App ready in %.2fs', TIMINGS['startup'])
 
 if __name__ == '__main__':
+    log.basicConfig(level=log.INFO)
+    logger.info('App ready in %.2fs', TIMINGS['startup'])
     app.run_server(port=8888,
                    debug=True)
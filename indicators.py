@@ -0,0 +1,269 @@
+import math
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+
+
+# ---------------------------------- #
+#        VECTORIZED INDICATORS       #
+# ---------------------------------- #
+
+# All of them take a Series (one symbol) or a DataFrame (one column per
+# symbol) and return the same shape.
+
+def sma(price, window):
+    return price.rolling(window).mean()
+
+
+def ema(price, window):
+    return price.ewm(span=window, adjust=False).mean()
+
+
+def rolling_std(price, window):
+    return price.rolling(window).std()
+
+
+def rolling_min(price, window):
+    return price.rolling(window).min()
+
+
+def rolling_max(price, window):
+    return price.rolling(window).max()
+
+
+def _wilder(price, window):
+    # Wilder's smoothing is an EMA with alpha = 1/window
+    change = price.diff()
+    gain = change.clip(lower=0).ewm(alpha=1. / window, adjust=False).mean()
+    loss = (-change).clip(lower=0).ewm(alpha=1. / window, adjust=False).mean()
+    return gain, loss
+
+
+def rsi(price, window):
+    gain, loss = _wilder(price, window)
+    return 100. - 100. / (1. + gain / loss)
+
+
+def bollinger(price, window, width):
+    mid = sma(price, window)
+    band = width * rolling_std(price, window)
+    return mid - band, mid + band
+
+
+FUNCTIONS = {
+    'sma': sma,
+    'ema': ema,
+    'std': rolling_std,
+    'min': rolling_min,
+    'max': rolling_max,
+    'rsi': rsi,
+}
+
+
+# ---------------------------------- #
+#           ROLLING STATES           #
+# ---------------------------------- #
+
+# A state is built from a full computation and then takes one new bar at a
+# time in O(1). `update(x)` returns the indicator's value on the new bar.
+
+class SMAState:
+
+    def __init__(self, price, window):
+        self.window = window
+        self.values = deque(price[-window:], maxlen=window)
+        self.total = math.fsum(self.values)
+
+    def update(self, x):
+        if len(self.values) == self.window:
+            self.total -= self.values[0]
+        self.values.append(x)
+        self.total += x
+        if len(self.values) < self.window:
+            return np.nan
+        return self.total / self.window
+
+
+class StdState:
+
+    def __init__(self, price, window):
+        self.window = window
+        self.values = deque(price[-window:], maxlen=window)
+        self.total = math.fsum(self.values)
+        self.squares = math.fsum(x * x for x in self.values)
+
+    def update(self, x):
+        if len(self.values) == self.window:
+            old = self.values[0]
+            self.total -= old
+            self.squares -= old * old
+        self.values.append(x)
+        self.total += x
+        self.squares += x * x
+        n = len(self.values)
+        if n < self.window or n < 2:
+            return np.nan
+        var = (self.squares - self.total * self.total / n) / (n - 1)
+        return math.sqrt(max(var, 0.))
+
+
+class EMAState:
+
+    def __init__(self, price, window, last):
+        self.alpha = 2. / (window + 1.)
+        self.value = last
+
+    def update(self, x):
+        self.value = self.alpha * x + (1. - self.alpha) * self.value
+        return self.value
+
+
+class RSIState:
+
+    def __init__(self, price, window, gain, loss):
+        self.alpha = 1. / window
+        self.last = price[-1]
+        self.gain = gain
+        self.loss = loss
+
+    def update(self, x):
+        change = x - self.last
+        self.last = x
+        self.gain += self.alpha * (max(change, 0.) - self.gain)
+        self.loss += self.alpha * (max(-change, 0.) - self.loss)
+        if self.loss == 0:
+            return 100.
+        return 100. - 100. / (1. + self.gain / self.loss)
+
+
+def full(price, kind, window):
+    """
+      Compute an indicator over a whole series, with its rolling state.
+
+      Returns:
+        tuple: the values (ndarray) and the state, None when the indicator
+          has no incremental form or the series ends with missing data.
+
+    """
+    values = FUNCTIONS[kind](price, window).to_numpy(dtype=float)
+    raw = price.to_numpy(dtype=float)
+    tail = raw[-window:]
+    if len(raw) == 0 or np.isnan(tail).any():
+        return values, None
+
+    if kind == 'sma':
+        state = SMAState(tail, window)
+    elif kind == 'std':
+        state = StdState(tail, window)
+    elif kind == 'ema':
+        state = EMAState(tail, window, values[-1])
+    elif kind == 'rsi' and len(raw) > 1:
+        gain, loss = _wilder(price, window)
+        state = RSIState(tail, window, gain.iloc[-1], loss.iloc[-1])
+    else:
+        state = None
+    return values, state
+
+
+# ---------------------------------- #
+#           INDICATOR CACHE          #
+# ---------------------------------- #
+
+class IndicatorCache:
+    """
+      Indicators memoized per (symbol, interval, field, kind, window) and
+      first date.
+
+      When the same series comes back with new bars appended, only the new
+      bars go through the rolling state. Anything else (a revised bar, a
+      different history) is computed again from scratch.
+
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, symb, interval, field, price, kind, window):
+        """
+          An indicator of a symbol's price series.
+
+          Parameters:
+            symb, interval, field (str): what the series is
+            price (Series): the series itself, date indexed
+            kind (str): a key of FUNCTIONS
+            window (int): look-back in bars
+
+          Returns:
+            Series: the indicator, on the index of `price`
+
+        """
+        # Series starting on different dates (a backtest range, the full
+        # history on the chart) are kept apart instead of evicting each other
+        first = price.index[0] if len(price) else None
+        key = (symb, interval, field, kind, window, first)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        values = None
+        if entry is not None:
+            with entry['lock']:
+                values = self._extend(entry, price)
+        if values is None:
+            values, state = full(price, kind, window)
+            entry = {'index': price.index, 'values': values, 'state': state,
+                     'last': price.iloc[-1] if len(price) else None,
+                     'lock': threading.Lock()}
+            with self._lock:
+                self._entries[key] = entry
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        return pd.Series(values, index=price.index, name=kind + str(window))
+
+    @staticmethod
+    def _extend(entry, price):
+        index, known = entry['index'], len(entry['index'])
+        if len(price) < known or known == 0 or \
+                price.index[0] != index[0] or price.index[known - 1] != index[-1]:
+            return None
+        # The last known bar may have been revised (e.g. an intraday quote)
+        if price.iloc[known - 1] != entry['last']:
+            return None
+        if len(price) == known:
+            return entry['values']
+
+        new = price.to_numpy(dtype=float)[known:]
+        state = entry['state']
+        if state is None or np.isnan(new).any():
+            return None
+        update = [state.update(x) for x in new]
+        entry['values'] = np.concatenate([entry['values'], update])
+        entry['index'] = price.index
+        entry['last'] = price.iloc[-1]
+        return entry['values']
+
+
+# Shared by the charts and the backtest engine
+CACHE = IndicatorCache()
+
+
+class Memo:
+    """
+      The shared cache seen from one dataset, for engine.indicator().
+
+    """
+
+    def __init__(self, symb, interval, field):
+        self.symb = symb
+        self.interval = interval
+        self.field = field
+
+    def get(self, price, kind, window):
+        return CACHE.get(self.symb, self.interval, self.field, price, kind,
+                         window)
@@ -0,0 +1,259 @@
+import os
+import datetime as dt
+import logging as log
+
+import numpy as np
+import pandas as pd
+
+import framestore as fst
+import metrics as mx
+import providers as pvd
+import singleflight as sf
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+logger = log.getLogger(__name__)
+
+myvars = GlobVars()
+
+INTERVALS = list(pvd.INTRADAY_INTERVALS)
+
+# How far back the providers serve each interval
+LOOKBACK = {
+    '1m': dt.timedelta(days=7),
+    '5m': dt.timedelta(days=59),
+    '1h': dt.timedelta(days=729),
+}
+
+# Span the chart opens on, before any zoom
+WINDOW = {
+    '1m': pd.Timedelta(days=2),
+    '5m': pd.Timedelta(days=10),
+    '1h': pd.Timedelta(days=90),
+}
+
+# Extra history read before a range, so that the 200-bar moving average
+# is defined from its first bar
+WARMUP = {
+    '1m': pd.Timedelta(days=3),
+    '5m': pd.Timedelta(days=7),
+    '1h': pd.Timedelta(days=60),
+}
+
+# Rows of a partition file, times are in seconds since the epoch
+ROWS = ['Time'] + pvd.INTRADAY_COLUMNS
+
+
+# ---------------------------------- #
+#          PARTITIONED STORE         #
+# ---------------------------------- #
+
+def _save(path, data):
+    # np.save() would add '.npy' to a path without it
+    with open(path, 'wb') as handle:
+        np.save(handle, data)
+
+
+class IntradayStore:
+    """
+      Intraday bars on disk, one NumPy file per symbol, interval and month.
+
+      A file holds a (6, bars) float array: a row of times and a row per
+      OHLCV field. Reads map the files in memory and binary search the time
+      row, so only the bars of the requested range are copied. Updates only
+      download the bars since the last stored one, and are not made while
+      the last check is younger than `refresh` seconds.
+
+    """
+
+    def __init__(self, provider=None, folder=None, refresh=None):
+        self.provider = provider or pvd.get_provider()
+        self.folder = folder or os.path.join(myvars.cachedir, 'intraday')
+        self.refresh = myvars.intradayrefresh if refresh is None else refresh
+
+    def directory(self, symb, interval):
+        return os.path.join(self.folder, interval, symb.upper())
+
+    def months(self, symb, interval):
+        """
+          The stored months of a symbol, as sorted 'YYYY-MM' strings.
+
+        """
+        try:
+            names = os.listdir(self.directory(symb, interval))
+        except OSError:
+            return []
+        return sorted(name[:-4] for name in names if name.endswith('.npy'))
+
+    def path(self, symb, interval, month):
+        return os.path.join(self.directory(symb, interval), month + '.npy')
+
+    def is_fresh(self, symb, interval):
+        stamp = os.path.join(self.directory(symb, interval), '.checked')
+        try:
+            age = dt.datetime.now().timestamp() - os.path.getmtime(stamp)
+        except OSError:
+            return False
+        return age < self.refresh
+
+    def bars(self, symb, interval, start=None, end=None):
+        """
+          Intraday bars of a symbol in a time range.
+
+          Parameters:
+            symb (str): ticker symbol, case insensitive
+            interval (str): one of INTERVALS
+            start (datetime): (default: None) first time, the oldest stored
+              bar if None
+            end (datetime): (default: None) last time, a date includes that
+              whole day, the newest bar if None
+
+          Returns:
+            DataFrame: the OHLCV bars, empty for an unknown symbol
+
+        """
+        if not self.is_fresh(symb, interval):
+            # One download per symbol and interval, whoever else asks waits
+            key = 'intraday:{}:{}'.format(self.directory(symb, interval),
+                                          self.provider.name)
+            with mx.upstream('intraday'):
+                sf.FLIGHTS.do(key, self._refresh, symb, interval)
+        return self.read(symb, interval, start, end)
+
+    def _refresh(self, symb, interval):
+        # Another worker may have updated it while we waited for the lock
+        if not self.is_fresh(symb, interval):
+            self.update(symb, interval)
+
+    def read(self, symb, interval, start=None, end=None):
+        """
+          The stored bars of a range, see bars(). Nothing is downloaded.
+
+        """
+        first = pd.Timestamp(start) if start is not None else None
+        last = pd.Timestamp(end) if end is not None else None
+        if last is not None and last == last.normalize():
+            last += pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+
+        chunks = []
+        for month in self.months(symb, interval):
+            if first is not None and month < first.strftime('%Y-%m') or \
+                    last is not None and month > last.strftime('%Y-%m'):
+                continue
+            data = np.load(self.path(symb, interval, month), mmap_mode='r')
+            lo = data[0].searchsorted(first.timestamp()) if first else 0
+            hi = data[0].searchsorted(last.timestamp(), side='right') \
+                if last else data.shape[1]
+            chunks.append(np.array(data[:, lo:hi]))
+
+        data = np.concatenate(chunks, axis=1) if chunks \
+            else np.empty((len(ROWS), 0))
+        index = pd.to_datetime(data[0], unit='s').rename('Date')
+        return pd.DataFrame(data[1:].T, index=index,
+                            columns=pvd.INTRADAY_COLUMNS)
+
+    def write(self, symb, interval, df):
+        """
+          Store bars, they replace the stored ones from their first time on.
+
+        """
+        os.makedirs(self.directory(symb, interval), exist_ok=True)
+        # Naive wall-clock times, stored as if they were UTC
+        seconds = df.index.asi8 // 10**9
+        months = df.index.strftime('%Y-%m')
+        for month in np.unique(months):
+            rows = months == month
+            fresh = np.vstack([seconds[rows],
+                               df.loc[rows, pvd.INTRADAY_COLUMNS].to_numpy().T])
+
+            path = self.path(symb, interval, month)
+            if os.path.exists(path):
+                stored = np.load(path)
+                stored = stored[:, stored[0] < fresh[0, 0]]
+                fresh = np.concatenate([stored, fresh], axis=1)
+
+            fst.write_atomic(path, lambda tmp: _save(tmp, fresh.astype(float)))
+
+    def update(self, symb, interval):
+        """
+          Download the bars after the last stored one, the last stored day is
+          fetched again since it may have been taken during the session.
+
+        """
+        today = dt.date.today()
+        start = today - LOOKBACK[interval]
+        months = self.months(symb, interval)
+        if months:
+            stored = np.load(self.path(symb, interval, months[-1]),
+                             mmap_mode='r')
+            if stored.shape[1]:
+                last = pd.to_datetime(stored[0, -1], unit='s').date()
+                start = max(start, last)
+
+        try:
+            fresh = self.provider.intraday(symb.upper(), interval, start)
+        except Exception:
+            logger.exception('Intraday download failed for %s', symb)
+            return
+        if not fresh.empty:
+            self.write(symb, interval, fresh)
+
+        os.makedirs(self.directory(symb, interval), exist_ok=True)
+        with open(os.path.join(self.directory(symb, interval), '.checked'),
+                  'w'):
+            pass
+
+    def at(self, interval):
+        """
+          The store seen as a source of one interval's bars, for
+          panel.load_panel().
+
+        """
+        return IntervalView(self, interval)
+
+
+class IntervalView:
+
+    def __init__(self, store, interval):
+        self.store = store
+        self.interval = interval
+
+    def history(self, symb, start=None):
+        return self.store.bars(symb, self.interval, start)
+
+
+def chart_window(store, symb, interval, xrange=None):
+    """
+      The bars a chart of a time range needs, and the range it shows.
+
+      Parameters:
+        store (IntradayStore): source of the bars
+        symb (str): ticker symbol
+        interval (str): one of INTERVALS
+        xrange (tuple): (default: None) (start, end) of a zoom, the latest
+          WINDOW if None
+
+      Returns:
+        tuple: the bars, with a margin and the moving average warm-up, and
+          the (start, end) range to show, None when there are no bars
+
+    """
+    if not xrange:
+        end = pd.Timestamp.now() + pd.Timedelta(days=1)
+        # A few more days cover a weekend or holiday since the last bar
+        ohlc = store.bars(symb, interval, end - WINDOW[interval] -
+                          WARMUP[interval] - pd.Timedelta(days=4), end)
+        if ohlc.empty:
+            return ohlc, None
+        xrange = (ohlc.index[-1] - WINDOW[interval], ohlc.index[-1])
+        return ohlc, xrange
+
+    margin = (xrange[1] - xrange[0]) / 4
+    ohlc = store.bars(symb, interval,
+                      xrange[0] - margin - WARMUP[interval],
+                      xrange[1] + margin)
+    return ohlc, (xrange if not ohlc.empty else None)
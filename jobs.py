@@ -0,0 +1,175 @@
+import os
+import time
+import uuid
+import pickle
+import sqlite3
+import logging as log
+from concurrent.futures import ThreadPoolExecutor
+
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+logger = log.getLogger(__name__)
+
+myvars = GlobVars()
+
+# A job is finished in any of these states
+FINISHED = ['done', 'failed', 'cancelled']
+
+# Finished jobs older than this (seconds) are deleted
+RETENTION = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    cancel INTEGER NOT NULL DEFAULT 0,
+    result BLOB,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def subtask(progress, low, high):
+    """
+      Map the progress of one step to its [low, high] share of a job.
+
+      Parameters:
+        progress (callable): the job's progress(fraction, message=None),
+          may be None
+        low, high (float): fractions of the job this step covers
+
+      Returns:
+        callable: a progress(fraction, message=None) for the step, or None
+
+    """
+    if progress is None:
+        return None
+
+    def step(fraction, message=None):
+        progress(low + (high - low) * fraction, message)
+    return step
+
+
+# ---------------------------------- #
+#              JOB QUEUE             #
+# ---------------------------------- #
+
+class JobQueue:
+    """
+      Runs long computations in a local thread pool, off the request thread.
+
+      Jobs live in a SQLite table, so any gunicorn worker can report the
+      progress of a job or cancel it, whichever worker runs it. A job is a
+      function taking a `progress(fraction, message=None)` keyword. Calling
+      it records how far the job is, and raises JobCancelled once the job
+      has been cancelled: that is where a job gets interrupted.
+
+    """
+
+    def __init__(self, path=None, workers=None):
+        self.path = path or os.path.join(myvars.cachedir, 'jobs.sqlite')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=workers or myvars.jobworkers)
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _update(self, job_id, **fields):
+        fields['updated'] = time.time()
+        columns = ', '.join('{} = ?'.format(name) for name in fields)
+        with self._connect() as db:
+            db.execute('UPDATE jobs SET {} WHERE id = ?'.format(columns),
+                       list(fields.values()) + [job_id])
+
+    def submit(self, fn, *args, **kwargs):
+        """
+          Queue fn(*args, progress=..., **kwargs) and return the job id.
+
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as db:
+            db.execute('DELETE FROM jobs WHERE updated < ? AND status IN '
+                       '(?, ?, ?)', [now - RETENTION] + FINISHED)
+            db.execute('INSERT INTO jobs (id, status, created, updated) '
+                       'VALUES (?, ?, ?, ?)', (job_id, 'queued', now, now))
+
+        self._pool.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        state = {'percent': -1}
+
+        def progress(fraction, message=None):
+            with self._connect() as db:
+                cancel, = db.execute('SELECT cancel FROM jobs WHERE id = ?',
+                                     (job_id,)).fetchone()
+            if cancel:
+                raise JobCancelled(job_id)
+            # Only write when the displayed percentage moves
+            percent = int(100 * min(max(fraction, 0.), 1.))
+            if percent != state['percent'] or message:
+                state['percent'] = percent
+                self._update(job_id, progress=percent, message=message)
+
+        try:
+            progress(0.)
+            self._update(job_id, status='running')
+            result = fn(*args, progress=progress, **kwargs)
+        except JobCancelled:
+            self._update(job_id, status='cancelled')
+        except Exception as err:
+            logger.exception('Job %s failed', job_id)
+            self._update(job_id, status='failed', message=str(err))
+        else:
+            self._update(job_id, status='done', progress=100,
+                         result=pickle.dumps(result))
+
+    def status(self, job_id):
+        """
+          State of a job.
+
+          Returns:
+            dict: 'status' (queued, running, done, failed or cancelled),
+              'progress' in percent and the last 'message', None for an
+              unknown job.
+
+        """
+        with self._connect() as db:
+            row = db.execute('SELECT status, progress, message FROM jobs '
+                             'WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(['status', 'progress', 'message'], row))
+
+    def result(self, job_id):
+        with self._connect() as db:
+            row = db.execute('SELECT result FROM jobs WHERE id = ?',
+                             (job_id,)).fetchone()
+        return pickle.loads(row[0]) if row and row[0] is not None else None
+
+    def cancel(self, job_id):
+        """
+          Ask a job to stop, a queued job is cancelled right away.
+
+        """
+        with self._connect() as db:
+            db.execute('UPDATE jobs SET cancel = 1, updated = ? WHERE id = ?',
+                       (time.time(), job_id))
+            db.execute('UPDATE jobs SET status = ? WHERE id = ? AND '
+                       'status = ?', ('cancelled', job_id, 'queued'))
@@ -1,6 +1,9 @@
 import dash
 import dash_bootstrap_components as dbc
 
+import metrics
+import serverperf
+
 # https://fontawesome.com/v4.7.0/icons/
 FONT_AWESOME = "https://use.fontawesome.com/releases/v5.10.2/css/all.css"
 
@@ -15,7 +18,11 @@ app = dash.Dash(__name__,
                 external_stylesheets=external_stylesheets,
                 update_title='Fetching...',
                 title="alphadash",
-                suppress_callback_exceptions=True
+                suppress_callback_exceptions=True,
+                # serverperf compresses, in brotli when the browser takes it
+                compress=False,
                 )
 
-server = app.server
\ No newline at end of file
+server = app.server
+serverperf.init_app(app)
+metrics.init_app(app)
@@ -0,0 +1,312 @@
+import io
+import os
+import time
+import pstats
+import cProfile
+import logging as log
+import threading
+import functools
+import contextlib
+from collections import deque
+
+import flask
+
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+logger = log.getLogger(__name__)
+
+myvars = GlobVars()
+
+PREFIX = 'alphadash_'
+
+# Name: (label, help). The quantiles are over the last `metricwindow`
+# observations of each label, sum and count over the worker's life.
+METRICS = {
+    'callback_seconds': (
+        'callback', 'Wall time of a Dash callback, serialization included'),
+    'callback_upstream_seconds': (
+        'callback', 'Time a Dash callback spent fetching or waiting for '
+                    'market data'),
+    'callback_serialize_seconds': (
+        'callback', 'Time Dash spent turning a callback\'s outputs into '
+                    'JSON'),
+    'callback_payload_bytes': (
+        'callback', 'Size of a Dash callback\'s response, uncompressed'),
+    'upstream_seconds': (
+        'source', 'Time spent fetching or waiting for market data'),
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+COLUMNS = ['p{:g}'.format(100 * q) for q in QUANTILES] + ['count', 'sum']
+
+
+# ---------------------------------- #
+#         ROLLING SUMMARIES          #
+# ---------------------------------- #
+
+class Rolling:
+    """
+      Quantiles of the last observations of a value, with the count and
+      sum of all of them.
+
+    """
+
+    def __init__(self, window=None):
+        self.values = deque(maxlen=window or myvars.metricwindow)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.values.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self, quantiles=QUANTILES):
+        # Interpolated between the closest ranks, as numpy.quantile does
+        values = sorted(self.values)
+        if not values:
+            return [float('nan')] * len(quantiles)
+        result = []
+        for q in quantiles:
+            at = q * (len(values) - 1)
+            low = int(at)
+            high = min(low + 1, len(values) - 1)
+            result.append(values[low] +
+                          (values[high] - values[low]) * (at - low))
+        return result
+
+
+class Registry:
+    """
+      The metrics of a worker, by name and label.
+
+      Each worker keeps its own: a scrape of /metrics sees the worker that
+      answered it, Prometheus tells them apart by instance.
+
+    """
+
+    def __init__(self, window=None):
+        self.window = window
+        self._metrics = {name: {} for name in METRICS}
+        self._lock = threading.Lock()
+
+    def observe(self, name, label, value):
+        with self._lock:
+            metric = self._metrics[name]
+            if label not in metric:
+                metric[label] = Rolling(self.window)
+            metric[label].observe(value)
+
+    def rows(self, name):
+        """
+          A metric's quantiles, count and sum by label.
+
+          Returns:
+            list: (label, dict) pairs, the dict keyed 'p50', 'p95', 'p99',
+              'count' and 'sum', sorted by p95, slowest first
+
+        """
+        with self._lock:
+            rows = [(label, rolling.quantiles() + [rolling.count, rolling.sum])
+                    for label, rolling in self._metrics[name].items()]
+        rows = [(label, dict(zip(COLUMNS, values))) for label, values in rows]
+        return sorted(rows, key=lambda row: row[1]['p95'], reverse=True)
+
+    def table(self, name):
+        """
+          rows() as a DataFrame indexed by label, for the admin page.
+
+        """
+        # Not imported at the top, /metrics and the worker's boot go without
+        # pandas
+        import pandas as pd
+        rows = self.rows(name)
+        return pd.DataFrame([row for _, row in rows],
+                            index=[label for label, _ in rows],
+                            columns=COLUMNS)
+
+    def prometheus(self):
+        """
+          Every metric as summaries in Prometheus' text format.
+
+        """
+        lines = []
+        for name, (label, text) in METRICS.items():
+            metric = PREFIX + name
+            lines += ['# HELP {} {}'.format(metric, text),
+                      '# TYPE {} summary'.format(metric)]
+            for key, row in self.rows(name):
+                key = str(key).replace('\\', r'\\').replace('"', r'\"')
+                for q in QUANTILES:
+                    lines.append('{}{{{}="{}",quantile="{:g}"}} {!r}'.format(
+                        metric, label, key, q, row['p{:g}'.format(100 * q)]))
+                lines.append('{}_sum{{{}="{}"}} {!r}'.format(
+                    metric, label, key, row['sum']))
+                lines.append('{}_count{{{}="{}"}} {:d}'.format(
+                    metric, label, key, int(row['count'])))
+
+        metric = PREFIX + 'startup_seconds'
+        lines += ['# HELP {} Time the worker took to start, by stage'
+                  .format(metric), '# TYPE {} gauge'.format(metric)]
+        for stage, seconds in list(STARTUP.items()):
+            lines.append('{}{{stage="{}"}} {!r}'.format(metric, stage,
+                                                        seconds))
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by the pages of a worker
+REGISTRY = Registry()
+
+# Callbacks slower than `profileslow`, newest first, see served()
+SLOW = deque(maxlen=20)
+
+# Seconds the worker took to start and to import each page, by stage,
+# filled by index.py
+STARTUP = {}
+
+
+# ---------------------------------- #
+#          INSTRUMENTATION           #
+# ---------------------------------- #
+
+# The callback running on each thread, with its upstream time so far
+_current = threading.local()
+
+
+@contextlib.contextmanager
+def upstream(source):
+    """
+      Time a fetch of market data, counted against the running callback.
+
+      Parameters:
+        source (str): what is fetched, e.g. 'ohlc' or 'profile'
+
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        REGISTRY.observe('upstream_seconds', source, elapsed)
+        if getattr(_current, 'upstream', None) is not None:
+            _current.upstream += elapsed
+
+
+def _profiler():
+    # None when not asked for, or when another profiler runs (Python 3.12
+    # allows one at a time)
+    if myvars.profileslow is None:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+def _keep_profile(name, profiler, wall):
+    folder = os.path.join(myvars.cachedir, 'profiles')
+    os.makedirs(folder, exist_ok=True)
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + \
+        '.{:03d}'.format(int(now * 1000) % 1000)
+    path = os.path.join(folder, '{}-{}.prof'.format(name, stamp))
+    profiler.dump_stats(path)
+
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative') \
+        .print_stats(25)
+    SLOW.appendleft({'callback': name, 'seconds': wall, 'time': stamp,
+                     'path': path, 'stats': text.getvalue()})
+    logger.warning('%s took %.2fs, profile in %s', name, wall, path)
+
+
+def timed(func):
+    """
+      Wrap a callback's function to measure it apart from Dash's work.
+
+    """
+    @functools.wraps(func)
+    def call(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.function = time.perf_counter() - started
+    return call
+
+
+def served(name, func):
+    """
+      Wrap a callback as Dash serves it: its function then the JSON
+      response.
+
+      The wall time, the upstream and serialization times and the size of
+      the response are recorded under `name`. With `profileslow` set in
+      settings the call is profiled, its profile kept if it took longer.
+
+    """
+    @functools.wraps(func)
+    def serve(*args, **kwargs):
+        _current.upstream = 0.0
+        _current.function = None
+        profiler = _profiler()
+        started = time.perf_counter()
+        body = None
+        try:
+            body = func(*args, **kwargs)
+            return body
+        finally:
+            wall = time.perf_counter() - started
+            if profiler is not None:
+                profiler.disable()
+            REGISTRY.observe('callback_seconds', name, wall)
+            REGISTRY.observe('callback_upstream_seconds', name,
+                             _current.upstream)
+            if body is not None:
+                function = _current.function or 0.0
+                REGISTRY.observe('callback_serialize_seconds', name,
+                                 max(wall - function, 0.0))
+                REGISTRY.observe('callback_payload_bytes', name, len(body))
+            if profiler is not None and wall > myvars.profileslow:
+                _keep_profile(name, profiler, wall)
+            _current.upstream = None
+    return serve
+
+
+def init_app(app):
+    """
+      Instrument every callback of a Dash app and serve /metrics.
+
+      Callbacks registered with app.callback from now on are measured, the
+      pages must be imported after this.
+
+    """
+    register = app.callback
+
+    def callback(*args, **kwargs):
+        decorator = register(*args, **kwargs)
+
+        def wrap(func):
+            name = func.__name__
+            registered = decorator(timed(func))
+            # Dash keeps the wrapper that serializes, measure that one
+            for entry in app.callback_map.values():
+                if entry.get('callback') is registered:
+                    entry['callback'] = served(name, registered)
+            return registered
+        return wrap
+
+    app.callback = callback
+
+    @app.server.route('/metrics')
+    def metrics():
+        return flask.Response(
+            REGISTRY.prometheus(),
+            content_type='text/plain; version=0.0.4; charset=utf-8')
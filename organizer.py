@@ -1,6 +1,21 @@
-import pandas as pd
-import yahooquery as yq
-from datetime import datetime
+from profiles import ProfileService
+import tradecal as tc
+
+# Shared by all callbacks, one batched request serves every module
+PROFILES = ProfileService()
+
+# How the fields of daily bars combine into longer bars
+OHLC_RULES = {'Open': 'first',
+              'High': 'max',
+              'Low': 'min',
+              'Close': 'last',
+              'Volume': 'sum'}
+
+# Resampling frequency of each chart/backtest interval
+RESAMPLE_FREQ = {'W': 'W-Fri',  # 'Week ending Friday'
+                 'M': 'M',  # Month ending on 30th or 31st
+                 'Q': 'Q',  # Quarter ending in Mar, Jun, Sep and Dec
+                 'Y': 'A'}  # Year ending on Dec 31st
 
 
 def exchange_code(exc_code):
@@ -63,42 +78,6 @@ def convert_unit(dollar, significant=2):
         return str(round(dollar / kilo, significant)) + 'K'
 
 
-def divi_info(df):
-    """
-      Summary line.
-
-      Extended description of function.
-
-      Parameters:
-      arg1 (int): Description of arg1
-
-      Returns:
-      int: Description of return value
-
-    """
-    div_pct = pd.DataFrame(columns=['FYyy', 'pct_yield'])
-    # We are using the Federal Fiscal Year for resampling
-    div_pct['pct_yield'] = (100 * df.Dividends / df.Close).resample("A-SEP").sum()
-    # Shifting the DateTime by 6 months so the data is plotted at mid-FY (3-31)
-    # div_pct.index = div_pct.index.shift(-6, freq='M')
-    # Creating a string of 'FY18', 'FY19' etc
-    year_string = div_pct.index.strftime('%y')
-    div_pct['FYyy'] = 'FY' + year_string
-    # The first row removed since it never has all the data for that FY
-    div_pct = div_pct[1:]
-
-    df.reset_index(inplace=True)
-    df_date = pd.DataFrame(columns=['Date'])
-    df_date['Date'] = df['Date'].dt.date
-
-    # If the calendar month is < OCT then remove current FY
-    today = datetime.today()
-    if int(today.month) < 10:
-        div_pct = div_pct[:-1]
-
-    return div_pct, df_date
-
-
 def regroup_interval(df, interval):
     """
       Summary line.
@@ -113,36 +92,26 @@ def regroup_interval(df, interval):
 
     """
 
-    ohlc_dict = {'Open': 'first',
-                 'High': 'max',
-                 'Low': 'min',
-                 'Close': 'last',
-                 'Volume': 'sum'}
-
-    if interval == 'W':
-        return df.resample('W-Fri').apply(ohlc_dict)  # 'Week ending Friday'
-    elif interval == 'M':
-        return df.resample('M').apply(ohlc_dict)  # Month ending on 30th or 31st
+    if interval in RESAMPLE_FREQ:
+        bars = df.resample(RESAMPLE_FREQ[interval]).apply(OHLC_RULES)
+        # Label each bar with its last trading day, not e.g. a Sunday
+        bars.index = tc.roll_back(bars.index)
+        return bars
     else:
         return df
 
 
 def asset_profile(symb, attribute):
     """
-      Summary line.
-
-      Extended description of function.
+      One quoteSummary module of a symbol, through the cached profile service.
 
       Parameters:
-      arg1 (int): Description of arg1
+        symb (str): ticker symbol
+        attribute (str): 'asset_profile', 'summary_detail' or 'quote_type'
 
       Returns:
-      int: Description of return value
+        dict: the module's data
 
     """
 
-    ticker = yq.Ticker(symb)
-    profile = getattr(ticker, attribute)
-    profile = profile[symb]
-
-    return profile
+    return PROFILES.get(symb, attribute)
@@ -0,0 +1,181 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from cachetools import TTLCache
+
+import organizer as oz
+import tradecal as tc
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+myvars = GlobVars()
+
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Panels assembled recently, they are rebuilt once the OHLC cache may refresh
+_panels = TTLCache(maxsize=16, ttl=myvars.refresh)
+_panels_lock = threading.Lock()
+
+
+def parse_symbols(text):
+    """
+      Unique upper-case symbols of a comma or space separated list.
+
+    """
+    symbols = (text or '').replace(',', ' ').upper().split()
+    return list(dict.fromkeys(symbols))
+
+
+# ---------------------------------- #
+#             PRICE PANEL            #
+# ---------------------------------- #
+
+class PricePanel:
+    """
+      Prices of many symbols aligned on the exchange's trading days.
+
+      Every field is a 2-D float array of shape (dates, symbols). `mask` is
+      True where a symbol actually has a bar. Gaps (before a listing, a
+      halt, ...) are forward filled, then back filled, so that the arrays
+      can go through vectorized code untouched. Strategies must not trade
+      where the mask is False.
+
+    """
+
+    def __init__(self, index, symbols, data, mask):
+        self.index = index
+        self.symbols = symbols
+        self.data = data
+        self.mask = mask
+
+    def __getitem__(self, field):
+        """
+          A field as a (dates x symbols) DataFrame over the same array.
+
+        """
+        return pd.DataFrame(self.data[field], index=self.index,
+                            columns=self.symbols, copy=False)
+
+    @classmethod
+    def from_frames(cls, frames):
+        """
+          Align per-symbol OHLC frames on the union of their dates.
+
+          Parameters:
+            frames (dict): symbol to its OHLC DataFrame
+
+          Returns:
+            PricePanel: empty frames are left out
+
+        """
+        frames = {symb: df for symb, df in frames.items() if not df.empty}
+        symbols = list(frames)
+        index = pd.DatetimeIndex([])
+        for df in frames.values():
+            index = index.union(df.index)
+        # Stray bars on days the exchange was closed are left out
+        index = index[tc.is_session(index)].rename('Date')
+
+        mask = np.zeros((len(index), len(symbols)), dtype=bool)
+        data = {field: np.full(mask.shape, np.nan) for field in FIELDS}
+        for col, symb in enumerate(symbols):
+            rows = index.get_indexer(frames[symb].index)
+            kept = rows >= 0
+            rows = rows[kept]
+            mask[rows, col] = True
+            for field in FIELDS:
+                data[field][rows, col] = frames[symb][field].to_numpy()[kept]
+
+        return cls(index, symbols, cls._fill(data), mask)
+
+    @staticmethod
+    def _fill(data):
+        for field, values in data.items():
+            if field == 'Volume':
+                data[field] = np.nan_to_num(values)
+            else:
+                data[field] = pd.DataFrame(values).ffill().bfill().to_numpy()
+        return data
+
+    def regroup(self, interval):
+        """
+          The panel in weekly or monthly bars, see organizer.regroup_interval.
+
+        """
+        if interval not in oz.RESAMPLE_FREQ:
+            return self
+
+        freq = oz.RESAMPLE_FREQ[interval]
+        mask = pd.DataFrame(self.mask, index=self.index)
+        grouped = mask.resample(freq).max().fillna(False).astype(bool)
+
+        data = {}
+        for field in FIELDS:
+            # Bars outside the mask are fills, they must not be aggregated
+            values = self[field].where(self.mask)
+            data[field] = values.resample(freq).agg(oz.OHLC_RULES[field]) \
+                                .to_numpy(dtype=float)
+
+        return PricePanel(tc.roll_back(grouped.index).rename('Date'),
+                          self.symbols,
+                          self._fill(data), grouped.to_numpy())
+
+
+def load_panel(symbols, store, start=None, end=None, workers=8,
+               progress=None):
+    """
+      Price panel of many symbols, loaded in parallel through the OHLC store.
+
+      Parameters:
+        symbols (list): ticker symbols
+        store (OHLCStore): source of the bars, daily ones or those of an
+          intraday.IntervalView
+        start (date): (default: None) first date, the data window if None
+        end (date): (default: None) last date, today if None
+        workers (int): (default: 8) concurrent downloads
+        progress (callable): (default: None) called with the fraction of
+          the symbols loaded, see jobs.JobQueue
+
+      Returns:
+        PricePanel: the symbols that have data in the range
+
+    """
+    # Intraday views of the store carry their interval
+    key = (tuple(symbols), str(start), str(end),
+           getattr(store, 'interval', 'D'))
+    with _panels_lock:
+        if key in _panels:
+            return _panels[key]
+
+    # Dates as strings, so that the last day is included whole
+    first = str(start) if start else None
+    last = str(end) if end else None
+
+    def history(symb):
+        return store.history(symb, start).loc[first:last]
+
+    frames = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(history, symb): symb for symb in symbols}
+        try:
+            for future in as_completed(futures):
+                frames[futures[future]] = future.result()
+                if progress:
+                    progress(len(frames) / len(symbols))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    # Keep the order the symbols were given in
+    frames = {symb: frames[symb] for symb in symbols}
+
+    panel = PricePanel.from_frames(frames)
+    with _panels_lock:
+        _panels[key] = panel
+    return panel
@@ -1,11 +1,17 @@
 import plotly.graph_objects as go
 # import plotly.express as px
 from plotly.subplots import make_subplots
+import numpy as np
+import pandas as pd
 
 import logging as log
 
 # local function
-import organizer as oz
+import indicators as idc
+import downsample as dsm
+import intraday as itd
+import benchmarks as bmk
+import tradecal as tc
 from settings import GlobVars
 
 
@@ -15,7 +21,8 @@ from settings import GlobVars
 
 logger = log.getLogger(__name__)
 logger.setLevel(log.WARNING)
-file_handler = log.FileHandler('logfile.log')
+# The file is only created with the first record
+file_handler = log.FileHandler('logfile.log', delay=True)
 formatter = log.Formatter(
     '[%(asctime)s] ! %(levelname)s ! [%(filename)s: line %(lineno)d] %(message)s'
     )
@@ -37,10 +44,80 @@ BKG_COLOR = 'rgba(236, 239, 241, 0.7)'
 #          PLOTTING FUNCS            #
 # ---------------------------------- #
 
+# DEF: Hover text of OHLC bars, of the rows at positions `at` (all if None)
+def ohlc_text(df, at=None):
+    # Built column-wise, str() of each rounded price as a per-bar loop would.
+    # Only the rows shown are rounded, `df` is left as it is.
+    def column(field):
+        values = df[field].to_numpy()
+        values = values if at is None else values[at]
+        return pd.Series(np.round(values, 2)).astype(str)
+
+    return (
+        'Open: $' + column('Open') +
+        '<br>High: $' + column('High') +
+        '<br>Low: $' + column('Low') +
+        '<br>Close: $' + column('Close')
+    ).tolist()
+
+
 # DEF: Customization of the OHLC chart
-def ohlc_chart(symb, df, field, ptyp_bool, sma_bool, vol_bool):
-    df.reset_index(inplace=True)
-    df['Date'] = df['Date'].dt.date
+# Traces are tagged with `meta`, the page toggles them by it on the client.
+# Beyond `points` bars in view, lines are downsampled and bars merged.
+# `xrange` draws only that date range (and a margin) at full resolution.
+# `bench` is a benchmarks.overlay() frame on the index of `df`.
+def ohlc_chart(symb, df, field, ptyp_bool, sma_bool, vol_bool, interval='D',
+               xrange=None, points=None, bench=None, bench_name=''):
+    # Moving averages come from the cache shared with the backtest engine
+    ma200 = idc.CACHE.get(symb, interval, field, df[field], 'sma', 200)
+    ma50 = idc.CACHE.get(symb, interval, field, df[field], 'sma', 50)
+    vol50 = idc.CACHE.get(symb, interval, 'Volume', df['Volume'], 'sma', 50)
+
+    if xrange:
+        # A margin on both sides, so that a short pan has data to show
+        margin = (xrange[1] - xrange[0]) / 4
+        view = slice(xrange[0] - margin, xrange[1] + margin)
+        # Past the last bar or in a gap there is nothing to zoom in on, the
+        # whole chart is drawn instead
+        if not df.loc[view].empty:
+            df, ma200, ma50, vol50 = [
+                data.loc[view] for data in (df, ma200, ma50, vol50)]
+            if bench is not None:
+                bench = bench.loc[view]
+
+    points = points or myvars.chartpoints
+
+    def kept(values):
+        # Positions a line trace keeps, all of them when it is short enough
+        if len(values) <= points:
+            return np.arange(len(values))
+        return dsm.thin(df.index, values.to_numpy(dtype=float), points,
+                        myvars.chartlod)
+
+    # The frame may be shared through the frame store or a cache, it is only
+    # read: the traces take NumPy arrays of the plotted points, and only
+    # those are rounded
+    def plotted(values, at):
+        return np.round(values.to_numpy()[at], 2)
+
+    price_at, ma200_at, ma50_at, vol50_at = [
+        kept(values) for values in (df[field], ma200, ma50, vol50)]
+    if bench is not None:
+        # Benchmark, rebased to the price at the start of the chart
+        relative = bmk.rebase(bench['Close'], df[field])
+        bench_at = kept(relative)
+
+    span = (df.index[0], df.index[-1])
+
+    bars = dsm.ohlc_buckets(df, points)
+    dates = df.index.to_numpy()
+    bar_dates = bars.index.to_numpy()
+    intraday = interval in itd.INTERVALS
+    # Whole days are drawn without a time. Intraday times are kept to the
+    # second, nanoseconds would be written as integers
+    unit = 'datetime64[s]' if intraday else 'datetime64[D]'
+    dates = dates.astype(unit)
+    bar_dates = bar_dates.astype(unit)
 
     vol_show = True if vol_bool[-1] == 1 else False
 
@@ -55,18 +132,6 @@ def ohlc_chart(symb, df, field, ptyp_bool, sma_bool, vol_bool):
         else:
             show50, show200 = False, True
 
-    df_round = round(df, 2)
-
-    hovertext = []
-    for i in range(len(df)):
-        hovertext.append(
-            # 'Date: '+str(df['Date'][i]) +
-            'Open: $' + str(df_round['Open'][i]) +
-            '<br>High: $' + str(df_round['High'][i]) +
-            '<br>Low: $' + str(df_round['Low'][i]) +
-            '<br>Close: $' + str(df_round['Close'][i])
-        )
-
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
     # Watermarking the stock ticker
@@ -80,13 +145,14 @@ def ohlc_chart(symb, df, field, ptyp_bool, sma_bool, vol_bool):
 
     # Price chart: Candlestick
     fig.add_trace(
-        go.Candlestick(x=df['Date'],
-                       open=df['Open'],
-                       high=df['High'],
-                       low=df['Low'],
-                       close=df['Close'],
+        go.Candlestick(x=bar_dates,
+                       open=bars['Open'].to_numpy(),
+                       high=bars['High'].to_numpy(),
+                       low=bars['Low'].to_numpy(),
+                       close=bars['Close'].to_numpy(),
                        name='Candles',
-                       text=hovertext,
+                       meta='candles',
+                       text=ohlc_text(bars),
                        hoverinfo='x+text',
                        visible=not ptyp_bool,
                        showlegend=False),
@@ -94,22 +160,42 @@ def ohlc_chart(symb, df, field, ptyp_bool, sma_bool, vol_bool):
 
     # Price chart
     fig.add_trace(
-        go.Scatter(x=df['Date'], y=df[field],
+        go.Scatter(x=dates[price_at], y=df[field].to_numpy()[price_at],
                    mode='lines',
                    name=field + ' Price',
+                   meta='line',
                    line=dict(color='#27AE60', width=2.5),
-                   text=hovertext,
+                   text=ohlc_text(df, price_at),
                    textposition='top left',
                    hoverinfo='x+text',
                    visible=ptyp_bool,
                    showlegend=False),
         secondary_y=True)
 
+    # Benchmark performance next to the price
+    if bench is not None:
+        fig.add_trace(
+            go.Scatter(x=dates[bench_at],
+                       y=plotted(relative, bench_at),
+                       customdata=plotted(bench[['Beta', 'Correlation']],
+                                          bench_at),
+                       name=bench_name,
+                       meta='benchmark',
+                       hovertemplate=bench_name + ': %{y:$.2f}'
+                                     '<br>Beta: %{customdata[0]}'
+                                     '<br>Corr: %{customdata[1]}'
+                                     '<extra></extra>',
+                       line=dict(color='rgb(96, 125, 139)', width=1.5,
+                                 dash='dot'),
+                       showlegend=False),
+            secondary_y=True)
+
     # 200-day Simple Moving Average
     fig.add_trace(
-        go.Scatter(x=df['Date'],
-                   y=round(df[field].rolling(200).mean(), 2),
+        go.Scatter(x=dates[ma200_at],
+                   y=plotted(ma200, ma200_at),
                    name='Mov. Av. (200d)',
+                   meta='sma200',
                    hoverinfo='x',
                    hovertemplate='MA200: %{y:$.1f}<extra></extra>',
                    line=dict(color='rgb(13, 71, 161)', width=1.8),
@@ -120,9 +206,10 @@ def ohlc_chart(symb, df, field, ptyp_bool, sma_bool, vol_bool):
 
     # 50-day Simple Moving Average
     fig.add_trace(
-        go.Scatter(x=df['Date'],
-                   y=round(df[field].rolling(50).mean(), 2),
+        go.Scatter(x=dates[ma50_at],
+                   y=plotted(ma50, ma50_at),
                    name='Mov. Av. (50d)',
+                   meta='sma50',
                    hoverinfo='x',
                    hovertemplate='MA50: %{y:$.1f}<extra></extra>',
                    line=dict(color='rgb(229, 57, 53)', width=1.5),
@@ -133,8 +220,9 @@ def ohlc_chart(symb, df, field, ptyp_bool, sma_bool, vol_bool):
 
     # Volume chart
     fig.add_trace(
-        go.Bar(x=df['Date'], y=df_round['Volume'],
+        go.Bar(x=bar_dates, y=np.round(bars['Volume'].to_numpy(), 2),
                name="Volume",
+               meta='volume',
                marker_color='rgba(179, 157, 219, 0.8)',
                hoverinfo='x',
                hovertemplate='Vol: %{y:.3s}<extra></extra>',
@@ -145,8 +233,9 @@ def ohlc_chart(symb, df, field, ptyp_bool, sma_bool, vol_bool):
 
     # 50-day Simple Moving Average of Volume
     fig.add_trace(
-        go.Scatter(x=df['Date'], y=round(df['Volume'].rolling(50).mean(), 2),
+        go.Scatter(x=dates[vol50_at], y=plotted(vol50, vol50_at),
                    name='Vol. Av. (50d)',
+                   meta='volume-ma',
                    hoverinfo='x',
                    hovertemplate='Vav: %{y:.3s}<extra></extra>',
                    line=dict(color='#330099', width=1.8),
@@ -179,15 +268,6 @@ def ohlc_chart(symb, df, field, ptyp_bool, sma_bool, vol_bool):
                      showgrid=False,
                      )
 
-    # Hide holidays
-    # this is a bit tricky, hiding weekends is causing gaps in monthly chart
-    # one needs to grab market calendar for each year as well
-    # check this: https://stackoverflow.com/questions/33094297/create-trading-holiday-calendar-with-pandas
-    # fig.update_xaxes(
-    #         rangebreaks=[
-    #             dict(bounds=["sat", "mon"]), #hide weekends
-    #             ])
-
     fig.update_xaxes(
         showgrid=False,
         showline=True,
@@ -206,6 +286,16 @@ def ohlc_chart(symb, df, field, ptyp_bool, sma_bool, vol_bool):
             ])
         ))
 
+    if xrange:
+        fig.update_xaxes(range=list(xrange))
+
+    # Intraday axes always skip the closed days and hours. Daily ones carry
+    # their breaks in the layout's meta, the holiday switch applies them.
+    if intraday:
+        fig.update_xaxes(rangebreaks=tc.rangebreaks(*span, intraday=True))
+    elif interval == 'D':
+        fig.update_layout(meta={'rangebreaks': tc.rangebreaks(*span)})
+
     fig.update_layout(
         height=550,
         plot_bgcolor=BKG_COLOR,
@@ -217,31 +307,21 @@ def ohlc_chart(symb, df, field, ptyp_bool, sma_bool, vol_bool):
     return fig
 
 
-# DEF: Customization of the Dividend Yield chart
-def div_chart(df):
+# DEF: Customization of the Dividend Yield chart, `divs` is the result of
+# dividends.analyze()
+def div_chart(divs):
 
-    # try:
-    #     df = df.set_index('Date')
-    # except KeyError:
-    #     logger.error('A Major error has happened.')
-    #     logger.exception("That Stupid Problem")
+    div_pct = divs['fiscal']
+    events = divs['events']
 
-    div_pct, df_date = oz.divi_info(df)
-
-    annotate_fy = []
-    for i in range(len(div_pct)):
-        annotate_fy.append('{0}: {1}%'.format(
-            str(div_pct['FYyy'][i]),
-            str(round(div_pct['pct_yield'][i], 2)
-                )
-            )
-        )
+    annotate_fy = (div_pct['FYyy'].astype(str) + ': ' +
+                   round(div_pct['Yield'], 2).astype(str) + '%').tolist()
 
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
     fig.add_trace(
         go.Scatter(
-            x=div_pct.index, y=div_pct['pct_yield'],
+            x=div_pct.index, y=div_pct['Yield'],
             name="DPS",
             texttemplate=annotate_fy,
             textposition="top center",
@@ -261,17 +341,13 @@ def div_chart(df):
         secondary_y=True,
     )
 
-    hovertext = []
-    for i in range(len(df)):
-        hovertext.append(
-            'Issued On: ' + str(df_date['Date'][i]) +
-            '<br>Yield/Share: $' + str(
-                round(df['Dividends'][i], 2))
-        )
+    hovertext = ('Issued On: ' + events.index.strftime('%Y-%m-%d') +
+                 '<br>Yield/Share: $' +
+                 round(events['Dividends'], 2).astype(str)).tolist()
 
     fig.add_trace(
         go.Bar(
-            x=df['Date'], y=round(df['Dividends'], 2),
+            x=events.index, y=round(events['Dividends'], 2),
             text=hovertext,
             hoverinfo='text',
             marker=dict(
@@ -317,9 +393,85 @@ def div_chart(df):
         font_family=SET_FONT,
         font_size=16,
         bargap=0.9,
-        title='Dividend History',
+        title='Dividend History<br><sup>' + div_summary(divs) + '</sup>',
         plot_bgcolor='rgba(236, 239, 241, 0.7)',
         margin=dict(r=0, t=90, l=0, b=45)
     )
 
     return fig
+
+
+def div_summary(divs):
+    # e.g. 'Quarterly · TTM yield 0.62% · DPS growth 7.1%/yr'
+    parts = [divs['cadence']]
+    if divs['ttm_dps']:
+        parts.append('TTM yield {:.2f}%'.format(divs['ttm_yield']))
+    if np.isfinite(divs['cagr']):
+        parts.append('DPS growth {:.1f}%/yr'.format(divs['cagr']))
+    return ' · '.join(parts)
+
+
+# DEF: Equity curve of a backtest, fills are marked unless None
+def equity_chart(ledger, fills=None):
+
+    fig = go.Figure()
+
+    if 'Benchmark' in ledger:
+        fig.add_trace(
+            go.Scatter(x=ledger.index, y=ledger['Benchmark'],
+                       name='Benchmark',
+                       mode='lines',
+                       line=dict(color='slategray', width=1.5, dash='dot'),
+                       hovertemplate='Benchmark: %{y:$,.0f}<extra></extra>',
+                       ))
+
+    fig.add_trace(
+        go.Scatter(x=ledger.index, y=ledger['Equity'],
+                   name='Equity',
+                   mode='lines',
+                   line=dict(color='#27AE60', width=2.5),
+                   hovertemplate='Equity: %{y:$,.0f}<extra></extra>',
+                   ))
+
+    # Fills are marked on the equity curve
+    markers = [('BUY', 'triangle-up', '#27AE60'),
+               ('SELL', 'triangle-down', '#E53935')]
+    for side, symbol, color in markers if fills is not None else []:
+        trades = fills[fills['Side'] == side]
+        fig.add_trace(
+            go.Scatter(x=trades.index,
+                       y=ledger['Equity'].reindex(trades.index),
+                       name=side.title(),
+                       mode='markers',
+                       marker=dict(symbol=symbol, color=color, size=10),
+                       customdata=trades[['Price', 'Shares']].to_numpy(),
+                       hovertemplate=side + ' %{customdata[1]:.2f} @ '
+                                     '%{customdata[0]:$.2f}<extra></extra>',
+                       ))
+
+    fig.update_xaxes(
+        showgrid=False,
+        showline=True,
+        linewidth=1.0, linecolor='black', mirror=True,
+    )
+
+    fig.update_yaxes(
+        zeroline=False,
+        tickformat='$,.0f',
+        showline=True,
+        linewidth=1.0, linecolor='black',
+        showgrid=True,
+        gridcolor='rgba(120, 144, 156, 0.2)',
+    )
+
+    fig.update_layout(
+        height=500,
+        plot_bgcolor=BKG_COLOR,
+        font_family=SET_FONT,
+        font_size=16,
+        hovermode='x',
+        legend=dict(orientation='h', y=1.08),
+        margin=dict(t=60, r=50)
+    )
+
+    return fig
@@ -0,0 +1,90 @@
+import time
+import asyncio
+import logging as log
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import organizer as oz
+import profiles
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+logger = log.getLogger(__name__)
+
+myvars = GlobVars()
+
+# The upstream libraries block, their calls run on these threads. As many as
+# pooled connections, more would only wait for one.
+EXECUTOR = ThreadPoolExecutor(max_workers=myvars.httppool,
+                              thread_name_prefix='fetch')
+
+
+# ---------------------------------- #
+#          CONCURRENT FETCH          #
+# ---------------------------------- #
+
+async def fetch_symbol(symb, store, service=None):
+    """
+      Everything the research page shows of a symbol, fetched concurrently.
+
+      The daily bars and the profile modules are requested at once instead
+      of one after the other, the modules share a single batched request.
+      Each call goes through the caches and single-flight of its store, so
+      the page's callbacks asking for the same data meanwhile wait for
+      these requests.
+
+      Parameters:
+        symb (str): ticker symbol
+        store (OHLCStore): where the daily bars come from
+        service (ProfileService): (default: None) the profiles, the one of
+          organizer if None
+
+      Returns:
+        dict: 'history' and each profile attribute, mapped to their data,
+          or to the exception their fetch raised
+
+    """
+    service = service or oz.PROFILES
+    calls = {'history': functools.partial(store.history, symb)}
+    for attribute in profiles.MODULES:
+        calls[attribute] = functools.partial(service.get, symb, attribute)
+
+    loop = asyncio.get_event_loop()
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(loop.run_in_executor(EXECUTOR, call) for call in calls.values()),
+        return_exceptions=True)
+    logger.info('%s fetched in %.2fs', symb, time.perf_counter() - started)
+
+    results = dict(zip(calls, results))
+    for name, result in results.items():
+        if isinstance(result, Exception):
+            logger.warning('Fetching %s of %s failed: %r', name, symb, result)
+    return results
+
+
+def fetch(symb, store, service=None):
+    """
+      Blocking form of fetch_symbol(), for threads without an event loop.
+
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(fetch_symbol(symb, store, service))
+    finally:
+        loop.close()
+
+
+def prefetch(symb, store, service=None):
+    """
+      Start fetching a symbol in the background, the results land in the
+      caches.
+
+    """
+    threading.Thread(target=fetch, args=(symb, store, service),
+                     daemon=True).start()
@@ -0,0 +1,93 @@
+import cache
+import metrics as mx
+import singleflight as sf
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+myvars = GlobVars()
+
+# Attribute names used by the app and their Yahoo! quoteSummary modules
+MODULES = {
+    'asset_profile': 'assetProfile',
+    'summary_detail': 'summaryDetail',
+    'quote_type': 'quoteType',
+}
+
+
+# ---------------------------------- #
+#           PROFILE SERVICE          #
+# ---------------------------------- #
+
+class ProfileService:
+    """
+      Batched and cached access to the quoteSummary modules of a symbol.
+
+      Every module has its own time-to-live (see `profilettl` in settings)
+      and is kept in a SharedCache, so each gunicorn worker finds what any of
+      them fetched. A miss fetches all the modules that are missing or
+      expired in a single request, and concurrent misses on the same symbol,
+      in any worker, wait for that one request instead of firing their own
+      (see singleflight).
+
+    """
+
+    def __init__(self, ttl=None, maxsize=512, folder=None):
+        ttl = ttl or myvars.profilettl
+        self._caches = {module: cache.SharedCache('profile.' + module,
+                                                  seconds, maxsize=maxsize,
+                                                  folder=folder)
+                        for module, seconds in ttl.items()}
+
+    def get(self, symb, attribute):
+        """
+          One module of a symbol's profile.
+
+          Parameters:
+            symb (str): ticker symbol, case insensitive
+            attribute (str): a key of MODULES, e.g. 'asset_profile'
+
+          Returns:
+            dict: the module's data, empty if Yahoo! has none
+
+        """
+        symb = symb.upper()
+        module = MODULES[attribute]
+
+        profile = self._caches[module].get(symb)
+        if profile is not None:
+            return profile
+
+        # One flight per symbol, the modules are fetched together
+        with mx.upstream('profile'):
+            profiles = sf.FLIGHTS.do('profile:' + symb, self._fetch, symb)
+        if module in profiles:
+            return profiles[module]
+        return self._caches[module].get(symb, {})
+
+    def _fetch(self, symb):
+        # yahooquery is slow to import, it is loaded with the first request
+        import yahooquery as yq
+        import httppool
+
+        # Another worker may have fetched them while we waited for the lock
+        stale = [module for module, shared in self._caches.items()
+                 if shared.get(symb) is None]
+        if not stale:
+            return {}
+
+        data = yq.Ticker(symb, session=httppool.session()).get_modules(stale)
+        # Keys follow the case the symbol was given in
+        data = next((value for key, value in data.items()
+                     if key.upper() == symb), {})
+        # An unknown symbol comes back as an error string
+        if not isinstance(data, dict):
+            data = {}
+
+        profiles = {module: data.get(module) or {} for module in stale}
+        for module, profile in profiles.items():
+            self._caches[module].set(symb, profile)
+        return profiles
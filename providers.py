@@ -0,0 +1,407 @@
+import os
+import threading
+import datetime as dt
+import logging as log
+
+import pandas as pd
+from cachetools import LRUCache
+
+import framestore as fst
+import metrics as mx
+import singleflight as sf
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+logger = log.getLogger(__name__)
+
+myvars = GlobVars()
+
+# Column layout of every frame handed out, it follows yfinance's history()
+OHLC_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume',
+                'Dividends', 'Stock Splits']
+
+INTRADAY_COLUMNS = OHLC_COLUMNS[:5]
+
+# Intraday intervals of the app and their name at the data providers
+INTRADAY_INTERVALS = {'1m': '1m', '5m': '5m', '1h': '60m'}
+
+# Intraday bars are kept in the exchange's local time
+EXCHANGE_TZ = 'America/New_York'
+
+
+def conform(df):
+    """
+      Bring a raw history frame to the common OHLC layout.
+
+      Parameters:
+        df (DataFrame): history indexed by date, with at least the OHLC fields
+
+      Returns:
+        DataFrame: sorted, de-duplicated, tz-naive 'Date' index and the
+          columns of OHLC_COLUMNS (missing event columns are zero-filled).
+
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=OHLC_COLUMNS,
+                            index=pd.DatetimeIndex([], name='Date'))
+
+    df = df.reindex(columns=OHLC_COLUMNS)
+    df[['Dividends', 'Stock Splits']] = \
+        df[['Dividends', 'Stock Splits']].fillna(0.)
+
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    df.index = index.normalize().rename('Date')
+
+    df = df[~df.index.duplicated(keep='last')]
+    return df.sort_index()
+
+
+def conform_intraday(df):
+    """
+      Bring a raw intraday frame to the common layout.
+
+      Parameters:
+        df (DataFrame): bars indexed by time, with at least the OHLC fields
+
+      Returns:
+        DataFrame: sorted, de-duplicated 'Date' index in the exchange's
+          wall-clock time (tz-naive) and the columns of INTRADAY_COLUMNS.
+
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=INTRADAY_COLUMNS,
+                            index=pd.DatetimeIndex([], name='Date'))
+
+    df = df.reindex(columns=INTRADAY_COLUMNS).astype(float)
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_convert(EXCHANGE_TZ).tz_localize(None)
+    df.index = index.rename('Date')
+
+    df = df[~df.index.duplicated(keep='last')]
+    return df.sort_index()
+
+
+# ---------------------------------- #
+#        MARKET DATA PROVIDERS       #
+# ---------------------------------- #
+
+class Provider:
+    """
+      Interface of a market data backend.
+
+      A provider only knows how to download daily bars for a date range,
+      caching is left to the OHLCStore below.
+
+    """
+    name = None
+
+    def history(self, symb, start, end=None):
+        """
+          Daily bars of a symbol.
+
+          Parameters:
+            symb (str): ticker symbol
+            start (date): first date to include
+            end (date): (default: None) last date to include, today if None
+
+          Returns:
+            DataFrame: bars in the layout of conform()
+
+        """
+        raise NotImplementedError
+
+    def intraday(self, symb, interval, start, end=None):
+        """
+          Intraday bars of a symbol.
+
+          Parameters:
+            symb (str): ticker symbol
+            interval (str): a key of INTRADAY_INTERVALS
+            start (date): first date to include
+            end (date): (default: None) last date to include, today if None
+
+          Returns:
+            DataFrame: bars in the layout of conform_intraday()
+
+        """
+        raise NotImplementedError
+
+
+class YFinanceProvider(Provider):
+    """
+      Yahoo! Finance through yfinance. The library is slow to import, it is
+      only loaded with the first download.
+
+    """
+    name = 'yfinance'
+
+    @staticmethod
+    def ticker(symb):
+        import yfinance as yf
+        import httppool
+        try:
+            return yf.Ticker(symb, session=httppool.session())
+        except TypeError:
+            # Older releases open their own connections
+            return yf.Ticker(symb)
+
+    def history(self, symb, start, end=None):
+        end = end or dt.date.today()
+        # yfinance treats 'end' as exclusive
+        ohlc = self.ticker(symb).history(start=str(start),
+                                         end=str(end + dt.timedelta(days=1)))
+        return conform(ohlc)
+
+    def intraday(self, symb, interval, start, end=None):
+        end = end or dt.date.today()
+        ohlc = self.ticker(symb).history(
+            interval=INTRADAY_INTERVALS[interval], start=str(start),
+            end=str(end + dt.timedelta(days=1)))
+        return conform_intraday(ohlc)
+
+
+class YahooQueryProvider(Provider):
+    """
+      Yahoo! Finance through yahooquery, loaded with the first download.
+
+    """
+    name = 'yahooquery'
+
+    @staticmethod
+    def ticker(symb):
+        import yahooquery as yq
+        import httppool
+        return yq.Ticker(symb, session=httppool.session())
+
+    def history(self, symb, start, end=None):
+        end = end or dt.date.today()
+        ohlc = self.ticker(symb).history(start=str(start),
+                                         end=str(end + dt.timedelta(days=1)))
+        # An unknown symbol comes back as a dict/str, not a frame
+        if not isinstance(ohlc, pd.DataFrame) or ohlc.empty:
+            return conform(None)
+
+        ohlc = ohlc.xs(symb, level=0) if ohlc.index.nlevels > 1 else ohlc
+        ohlc = ohlc.rename(columns={'open': 'Open', 'high': 'High',
+                                    'low': 'Low', 'close': 'Close',
+                                    'volume': 'Volume',
+                                    'dividends': 'Dividends',
+                                    'splits': 'Stock Splits'})
+
+        # Match yfinance's auto_adjust, prices are split/dividend adjusted
+        if 'adjclose' in ohlc:
+            ratio = ohlc['adjclose'] / ohlc['Close']
+            for field in ['Open', 'High', 'Low', 'Close']:
+                ohlc[field] = ohlc[field] * ratio
+
+        return conform(ohlc)
+
+    def intraday(self, symb, interval, start, end=None):
+        end = end or dt.date.today()
+        ohlc = self.ticker(symb).history(
+            interval=INTRADAY_INTERVALS[interval], start=str(start),
+            end=str(end + dt.timedelta(days=1)))
+        if not isinstance(ohlc, pd.DataFrame) or ohlc.empty:
+            return conform_intraday(None)
+
+        ohlc = ohlc.xs(symb, level=0) if ohlc.index.nlevels > 1 else ohlc
+        return conform_intraday(ohlc.rename(columns=str.capitalize))
+
+
+class FixtureProvider(Provider):
+    """
+      Stand-in backend that reads '<SYMB>.csv' files from a local folder.
+
+      The files have a 'Date' column followed by the OHLC_COLUMNS, which is
+      exactly what `DataFrame.to_csv()` writes for a yfinance history.
+      Intraday bars are read from '<SYMB>_<interval>.csv', e.g. 'SPY_5m.csv'.
+
+    """
+    name = 'fixture'
+
+    def __init__(self, folder=None):
+        self.folder = folder or myvars.fixturedir
+
+    def history(self, symb, start, end=None):
+        end = end or dt.date.today()
+        path = os.path.join(self.folder, symb.upper() + '.csv')
+        if not os.path.exists(path):
+            return conform(None)
+
+        ohlc = pd.read_csv(path, index_col='Date', parse_dates=True)
+        ohlc = conform(ohlc)
+        return ohlc.loc[str(start):str(end)]
+
+    def intraday(self, symb, interval, start, end=None):
+        end = end or dt.date.today()
+        path = os.path.join(self.folder,
+                            '{}_{}.csv'.format(symb.upper(), interval))
+        if not os.path.exists(path):
+            return conform_intraday(None)
+
+        ohlc = pd.read_csv(path, index_col='Date', parse_dates=True)
+        ohlc = conform_intraday(ohlc)
+        return ohlc.loc[str(start):str(end)]
+
+
+PROVIDERS = {
+    YFinanceProvider.name: YFinanceProvider,
+    YahooQueryProvider.name: YahooQueryProvider,
+    FixtureProvider.name: FixtureProvider,
+}
+
+
+def get_provider(name=None):
+    """
+      Instantiate a provider by name.
+
+      Parameters:
+        name (str): (default: None) one of PROVIDERS, the one in settings
+          if None
+
+      Returns:
+        Provider: the market data backend
+
+    """
+    name = name or myvars.provider
+    try:
+        return PROVIDERS[name]()
+    except KeyError:
+        raise ValueError('Unknown market data provider: {}'.format(name))
+
+
+# ---------------------------------- #
+#           PERSISTENT STORE         #
+# ---------------------------------- #
+
+class OHLCStore:
+    """
+      Per-symbol daily bars kept on disk as Parquet files.
+
+      The first request of a symbol downloads the whole data window. Later
+      requests only ask the provider for the bars since the last cached date,
+      and are not even made while the file is younger than `refresh` seconds.
+      Files are replaced atomically, so several gunicorn workers can share
+      one cache folder. Concurrent requests of a symbol share one download
+      (see singleflight), made by one worker at a time; the others then read
+      its file. Each worker also keeps the frames it read in memory until
+      their file changes.
+
+    """
+
+    def __init__(self, provider=None, folder=None, refresh=None, maxsize=128):
+        self.provider = provider or get_provider()
+        self.folder = folder or os.path.join(myvars.cachedir, 'ohlc')
+        self.refresh = myvars.refresh if refresh is None else refresh
+        self._memory = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        os.makedirs(self.folder, exist_ok=True)
+
+    def path(self, symb):
+        return os.path.join(self.folder, symb.upper() + '.parquet')
+
+    def load(self, symb):
+        """
+          The cached bars of a symbol, None if it was never fetched.
+
+          The frame is shared, do not modify it.
+
+        """
+        path = self.path(symb)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._memory.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        try:
+            df = pd.read_parquet(path)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._memory[path] = (mtime, df)
+        return df
+
+    def save(self, symb, df):
+        fst.write_atomic(self.path(symb), df.to_parquet)
+
+    def is_fresh(self, symb):
+        try:
+            age = dt.datetime.now().timestamp() - os.path.getmtime(self.path(symb))
+        except OSError:
+            return False
+        return age < self.refresh
+
+    def history(self, symb, start=None):
+        """
+          Daily bars of a symbol, fetching only what the cache lacks.
+
+          Parameters:
+            symb (str): ticker symbol, case insensitive
+            start (date): (default: None) first date returned, the start of
+              the data window in settings if None
+
+          Returns:
+            DataFrame: bars in the layout of conform(), empty for an unknown
+              symbol.
+
+        """
+        symb = symb.upper()
+        start = start or myvars.history
+        cached = self.load(symb)
+        if cached is not None and not cached.empty and self.is_fresh(symb):
+            return cached.loc[str(start):]
+
+        # One flight per file, whatever start each caller asked for
+        key = 'ohlc:{}:{}'.format(self.path(symb), self.provider.name)
+        with mx.upstream('ohlc'):
+            ohlc = sf.FLIGHTS.do(key, self._fetch, symb)
+        return ohlc if ohlc.empty else ohlc.loc[str(start):]
+
+    def _fetch(self, symb):
+        # Another worker may have fetched it while we waited for the lock
+        cached = self.load(symb)
+        if cached is None or cached.empty:
+            # The whole window, later calls may start earlier than this one
+            ohlc = self.provider.history(symb, myvars.history)
+        elif self.is_fresh(symb):
+            return cached
+        else:
+            ohlc = self.update(symb, cached)
+
+        if not ohlc.empty:
+            self.save(symb, ohlc)
+        return ohlc
+
+    def update(self, symb, cached):
+        """
+          Append the bars after the last cached date.
+
+          The last cached bar is fetched again since it may have been taken
+          while the market was open. A new dividend or split re-adjusts the
+          whole history, in that case everything is downloaded again.
+
+        """
+        last = cached.index[-1].date()
+        fresh = self.provider.history(symb, last)
+        if fresh.empty:
+            return cached
+
+        new_events = fresh.loc[fresh.index > cached.index[-1],
+                               ['Dividends', 'Stock Splits']]
+        if new_events.to_numpy().any():
+            logger.info('%s has a new dividend/split, refetching', symb)
+            return self.provider.history(symb, cached.index[0].date())
+
+        ohlc = pd.concat([cached[cached.index < fresh.index[0]], fresh])
+        return ohlc
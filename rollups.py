@@ -0,0 +1,112 @@
+import threading
+
+import pandas as pd
+from cachetools import LRUCache
+from pandas.tseries.frequencies import to_offset
+
+import organizer as oz
+
+
+# ---------------------------------- #
+#             ROLLUP STORE           #
+# ---------------------------------- #
+
+# Coarser levels built from a finer one instead of the daily bars,
+# months nest in quarters and years
+DERIVED = {'Q': 'M', 'Y': 'M'}
+
+
+class RollupStore:
+    """
+      Weekly, monthly, quarterly and yearly bars of daily datasets.
+
+      The levels of a dataset are resampled once and kept. When the same
+      dataset comes back with new daily bars, only the last bucket of each
+      level, the one still open, is resampled again. Datasets are told apart
+      by symbol and first date, a history is restarted when any bar before
+      the last one changed (e.g. a dividend adjusted the prices).
+
+    """
+
+    def __init__(self, maxsize=64):
+        self._entries = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def get(self, symb, df, interval):
+        """
+          A dataset in the bars of an interval, see organizer.regroup_interval.
+
+          Parameters:
+            symb (str): the dataset's symbol
+            df (DataFrame): its daily bars
+            interval (str): 'D' or a key of organizer.RESAMPLE_FREQ
+
+          Returns:
+            DataFrame: the bars, shared, do not modify them
+
+        """
+        if interval not in oz.RESAMPLE_FREQ or df.empty:
+            return df
+
+        key = (symb, df.index[0])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._extends(entry, df):
+                entry = {'levels': {}, 'starts': {}}
+                self._entries[key] = entry
+            elif len(df) > len(entry['index']) or \
+                    not df.iloc[-1].equals(entry['last']):
+                self._refresh(entry, df)
+            entry['index'] = df.index
+            entry['last'] = df.iloc[-1]
+            entry['before'] = df.iloc[-2] if len(df) > 1 else None
+
+            if interval not in entry['levels']:
+                self._build(entry, df, interval)
+            return entry['levels'][interval]
+
+    @staticmethod
+    def _extends(entry, df):
+        # True if `df` is the entry's history, maybe with its last bar
+        # revised, followed by new bars
+        known = len(entry['index'])
+        if len(df) < known:
+            return False
+        if df.index[known - 1] != entry['index'][-1]:
+            return False
+        if known > 1:
+            return df.index[known - 2] == entry['index'][-2] and \
+                df.iloc[known - 2].equals(entry['before'])
+        return True
+
+    def _build(self, entry, df, interval):
+        finer = DERIVED.get(interval)
+        if finer:
+            if finer not in entry['levels']:
+                self._build(entry, df, finer)
+            source = entry['levels'][finer]
+        else:
+            source = df
+        bars = oz.regroup_interval(source, interval)
+        entry['levels'][interval] = bars
+        entry['starts'][interval] = self._last_start(df, bars, interval)
+
+    def _refresh(self, entry, df):
+        for interval, bars in entry['levels'].items():
+            # Resample again from the first daily bar of the open bucket
+            start = entry['starts'][interval]
+            tail = oz.regroup_interval(df.iloc[start:], interval)
+            bars = pd.concat([bars.iloc[:-1], tail])
+            entry['levels'][interval] = bars
+            entry['starts'][interval] = self._last_start(df, bars, interval)
+
+    @staticmethod
+    def _last_start(df, bars, interval):
+        # Position of the first daily bar of the last bucket: buckets are
+        # closed on the right, the previous label ends the one before
+        previous = bars.index[-1] - to_offset(oz.RESAMPLE_FREQ[interval])
+        return int(df.index.searchsorted(previous, side='right'))
+
+
+# Shared by the pages of a worker
+ROLLUPS = RollupStore()
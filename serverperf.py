@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import threading
+
+import brotli
+from cachetools import LRUCache
+from flask import request
+
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+myvars = GlobVars()
+
+# Text the server sends, images and fonts are compressed already
+MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+}
+
+# Preferred first, brotli is smaller and faster at its default quality
+ENCODINGS = ('br', 'gzip')
+
+# URLs that change with their content: fetched once, never revalidated
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+# ---------------------------------- #
+#            COMPRESSION             #
+# ---------------------------------- #
+
+def digest(data):
+    """
+      Short hash of a response body, its ETag.
+
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class Compressor:
+    """
+      Compresses responses, keeping the compressed bodies by hash.
+
+      A body sent again, e.g. the same figure to another analyst or a page
+      reloaded, is found by its hash and not compressed a second time.
+
+    """
+
+    def __init__(self, minsize=None, quality=None, level=None,
+                 maxsize=None):
+        self.minsize = minsize or myvars.compressmin
+        self.quality = quality or myvars.brotliquality
+        self.level = level or myvars.gziplevel
+        self._bodies = LRUCache(maxsize=maxsize or myvars.compresscache,
+                                getsizeof=len)
+        self._lock = threading.Lock()
+
+    def compress(self, data, encoding, tag=None):
+        """
+          A body in one of ENCODINGS.
+
+          Parameters:
+            data (bytes): the body
+            encoding (str): 'br' or 'gzip'
+            tag (str): (default: None) the body's digest(), computed if None
+
+          Returns:
+            bytes: compressed, from the cache if it was sent before
+
+        """
+        key = (tag or digest(data), encoding)
+        with self._lock:
+            body = self._bodies.get(key)
+        if body is None:
+            if encoding == 'br':
+                body = brotli.compress(data, quality=self.quality)
+            else:
+                body = gzip.compress(data, compresslevel=self.level)
+            with self._lock:
+                self._bodies[key] = body
+        return body
+
+    def apply(self, response, tag=None):
+        """
+          Compress a response if the client takes it and it's worth it.
+
+        """
+        if response.mimetype not in MIMETYPES or \
+                response.status_code != 200 or \
+                'Content-Encoding' in response.headers:
+            return response
+        response.vary.add('Accept-Encoding')
+
+        # The quality the client gives each encoding, 0 if refused
+        encoding = next((e for e in ENCODINGS
+                         if request.accept_encodings[e]), None)
+        if encoding is None:
+            return response
+
+        # Static files are streamed from disk, read them in
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < self.minsize:
+            return response
+
+        response.set_data(self.compress(data, encoding, tag))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+# ---------------------------------- #
+#        CACHING AND VALIDATION      #
+# ---------------------------------- #
+
+class ServerPerf:
+    """
+      Compression and cache headers for every response of a Dash app.
+
+      - Assets with a fingerprint (Dash adds '?m=<modified time>' to the
+        CSS and JS it links, and a version to the component bundles) are
+        cached as immutable. Other assets are revalidated on each use,
+        Flask answers 304 while their file is unchanged.
+      - The page, layout and callback list are given an ETag and answered
+        304 while they are unchanged.
+      - Text responses are compressed, see Compressor.
+
+      Callback outputs are POST responses, browsers neither cache nor
+      revalidate those: a repeated output is still sent, but its compressed
+      body comes from the Compressor's cache.
+
+    """
+
+    def __init__(self, app, compressor=None):
+        self.compressor = compressor or Compressor()
+        prefix = app.config.routes_pathname_prefix
+        self.assets = '{}{}/'.format(prefix,
+                                     app.config.assets_url_path.strip('/'))
+        self.suites = prefix + '_dash-component-suites/'
+        app.server.after_request(self.after_request)
+
+    def after_request(self, response):
+        path = request.path
+        tag = None
+        if path.startswith(self.assets):
+            if request.args.get('m'):
+                response.headers['Cache-Control'] = IMMUTABLE
+            else:
+                response.headers['Cache-Control'] = 'no-cache'
+        elif path.startswith(self.suites):
+            if response.cache_control.max_age:
+                response.headers['Cache-Control'] = IMMUTABLE
+        elif request.method == 'GET' and response.status_code == 200 and \
+                not response.direct_passthrough:
+            # Weak: the compressed forms share the tag of the body
+            tag = digest(response.get_data())
+            response.set_etag(tag, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.make_conditional(request)
+        return self.compressor.apply(response, tag)
+
+
+def init_app(app):
+    """
+      Speed up the responses of a Dash app, see ServerPerf.
+
+      The app must be created with compress=False, Dash's own compression
+      would otherwise run too.
+
+    """
+    return ServerPerf(app)
@@ -1,6 +1,10 @@
+import os
 import datetime as dt
 from dateutil.relativedelta import relativedelta
 
+# Root of the app, every local cache lives under here
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
 
 class GlobVars:
 
@@ -10,6 +14,54 @@ class GlobVars:
         self.today = dt.datetime.today().date()
         self.history = self.today - relativedelta(years=self.datawindow)
 
+        # Market data: 'yfinance', 'yahooquery' or 'fixture'
+        self.provider = 'yfinance'
+        self.cachedir = os.path.join(ROOT_DIR, 'cache')
+        self.fixturedir = os.path.join(ROOT_DIR, 'fixtures')
+        # Symbols and names offered by the ticker search, see universe.py
+        self.tickerfile = os.path.join(ROOT_DIR, 'tickers.csv')
+        # Seconds before a cached symbol is checked again for new bars
+        self.refresh = 15 * 60
+        # Seconds before a symbol's intraday bars are checked again
+        self.intradayrefresh = 60
+        # Memory cap (bytes) of the per-worker dataset LRU
+        self.framecap = 256 * 2**20
+        # Most bars the price chart draws per trace, longer ranges are
+        # downsampled ('lttb' or 'minmax' for the lines)
+        self.chartpoints = 1200
+        self.chartlod = 'lttb'
+        # Send the price chart's arrays in binary (see figcodec.py)
+        self.chartbinary = True
+        # Threads running backtests in the background, per worker
+        self.jobworkers = 2
+        # Connections kept open to each data provider, and the seconds
+        # before one of their requests fails
+        self.httppool = 10
+        self.httptimeout = 20
+        # Most seconds a worker waits for another one fetching the same
+        # symbol before it fetches it itself
+        self.fetchwait = 60
+        # Responses smaller than `compressmin` bytes are sent as they are,
+        # larger ones in brotli (quality 0-11) or else gzip (level 1-9).
+        # Compressed bodies are kept for repeated responses, up to
+        # `compresscache` bytes per worker.
+        self.compressmin = 1024
+        self.brotliquality = 4
+        self.gziplevel = 6
+        self.compresscache = 32 * 2**20
+        # Latest observations each latency quantile is taken over, see
+        # metrics.py. Callbacks are profiled when `profileslow` is a number
+        # of seconds, their profile kept if they take longer (profiling
+        # slows every callback down, None to not profile)
+        self.metricwindow = 1024
+        self.profileslow = None
+        # Seconds each quoteSummary module is cached: quotes move, profiles don't
+        self.profilettl = {
+            'summaryDetail': 60,
+            'quoteType': 60 * 60,
+            'assetProfile': 24 * 60 * 60,
+            }
+
         self.font = "Droid Sans"
         self.oceanblue = '#0077BE'
         self.dollargreen = '#85bb65'
@@ -0,0 +1,77 @@
+import threading
+
+import cache
+
+
+# ---------------------------------- #
+#           CALL COALESCING          #
+# ---------------------------------- #
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Group:
+    """
+      Coalesces concurrent calls for the same key into one.
+
+      While a call is in flight, the callers asking for the same key wait for
+      it and get its result, or its exception, instead of calling again: a
+      hot symbol opened by many sessions costs one upstream request. With
+      `shared` the call also holds cache.fetch_lock, so one worker at a time
+      makes it; the callee should then look for a result another worker
+      stored before fetching.
+
+    """
+
+    def __init__(self, shared=False):
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        """
+          The result of `func(*args, **kwargs)`, shared by concurrent callers.
+
+          Parameters:
+            key (str): what the call fetches, e.g. 'ohlc:AAPL'
+            func (callable): the fetch
+
+          Returns:
+            whatever `func` returned, to every caller of the same flight
+
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if self.shared:
+                with cache.fetch_lock(key):
+                    call.result = func(*args, **kwargs)
+            else:
+                call.result = func(*args, **kwargs)
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+# Shared by the market data fetches of a worker
+FLIGHTS = Group(shared=True)
@@ -0,0 +1,238 @@
+import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import engine as eg
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+# Grids used when the page leaves the parameter ranges empty
+DEFAULT_GRIDS = {
+    'BH': '',
+    'DCA': 'freq=W;M;Q',
+    'BLSH': 'window=10:60:10, low=0.1:0.3:0.05, high=0.7:0.9:0.05',
+    'MAC': 'fast=10:100:10, slow=50:300:25',
+    'RSI': 'window=7:28:7, low=20:40:5, high=60:80:5',
+    'BBC': 'window=10:60:5, width=1:3:0.25',
+}
+
+# Below this many combinations a process pool costs more than it saves
+POOL_THRESHOLD = 64
+
+METRICS = ['return', 'cagr', 'volatility', 'sharpe', 'drawdown', 'trades']
+
+
+def _number(text):
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def parse_grid(text, strategy=None):
+    """
+      Parameter ranges from a text such as 'fast=10:60:10, slow=100;200'.
+
+      'start:stop:step' is an inclusive range, 'a;b;c' a list of values.
+
+      Parameters:
+        text (str): comma separated 'name=values' items
+        strategy (str): (default: None) if given, the names must be
+          parameters of this strategy and the values of their kind
+
+      Returns:
+        dict: parameter name to the list of its values
+
+      Raises:
+        ValueError: the text is not a grid, with what is wrong in it
+
+    """
+    defaults = eg.STRATEGIES[strategy] if strategy else None
+    grid = {}
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        name, equal, values = item.partition('=')
+        name = name.strip()
+        if not equal or not name or not values.strip():
+            raise ValueError("'{}' is not of the form name=values".format(item))
+        if defaults is not None and name not in defaults:
+            raise ValueError("{} has no parameter '{}'{}".format(
+                strategy, name, ', only ' + ', '.join(defaults)
+                if defaults else ''))
+
+        if ':' in values:
+            bounds = [_number(value.strip()) for value in values.split(':')]
+            if len(bounds) != 3 or \
+                    not all(isinstance(value, (int, float)) for value in bounds):
+                raise ValueError("'{}' is not a start:stop:step range of "
+                                 "numbers".format(values.strip()))
+            start, stop, step = bounds
+            if step <= 0 or stop < start:
+                raise ValueError("'{}' is empty, the step must be positive "
+                                 "and stop >= start".format(values.strip()))
+            values = np.arange(start, stop + step / 2., step)
+            if all(float(value).is_integer() for value in bounds):
+                values = values.astype(int)
+            grid[name] = [value.item() for value in np.round(values, 10)]
+        else:
+            grid[name] = [_number(value.strip()) for value in values.split(';')]
+
+        if defaults is not None:
+            # Numbers where the default is one, text where it is text
+            number = isinstance(defaults[name], (int, float))
+            wrong = [value for value in grid[name]
+                     if isinstance(value, (int, float)) != number]
+            if wrong:
+                raise ValueError("{} must be {}, not '{}'".format(
+                    name, 'a number' if number else 'a word', wrong[0]))
+    return grid
+
+
+def combinations(strategy, grid):
+    """
+      Every parameter combination of a grid, minus the meaningless ones.
+
+    """
+    names = sorted(grid)
+    combos = [dict(zip(names, values))
+              for values in itertools.product(*(grid[name] for name in names))]
+    if strategy == 'MAC':
+        combos = [combo for combo in combos
+                  if combo.get('fast', 0) < combo.get('slow', np.inf)]
+    if strategy in ['BLSH', 'RSI']:
+        combos = [combo for combo in combos
+                  if combo.get('low', -np.inf) < combo.get('high', np.inf)]
+    return combos
+
+
+def indicator_bank(price, close, strategy, combos, sizing):
+    """
+      Compute every rolling indicator the combinations need exactly once.
+
+    """
+    bank = {}
+    for name, param in eg.NEEDS.get(strategy, []):
+        windows = {combo.get(param, eg.STRATEGIES[strategy][param])
+                   for combo in combos}
+        for window in windows:
+            eg.indicator(price, name, window, bank)
+    if sizing == 'Kelly':
+        bank['kelly'] = eg.kelly_fraction(close)
+    return bank
+
+
+# ---------------------------------- #
+#            PROCESS POOL            #
+# ---------------------------------- #
+
+# Set once in every worker, so the data is not pickled with each task
+_shared = {}
+
+
+def _init_worker(ohlc, bank, setup):
+    _shared['ohlc'] = ohlc
+    _shared['bank'] = bank
+    _shared['setup'] = setup
+
+
+def _evaluate_chunk(combos):
+    return evaluate(_shared['ohlc'], _shared['bank'], _shared['setup'], combos)
+
+
+def evaluate(ohlc, bank, setup, combos):
+    """
+      Performance of a list of combinations, one dict per combination.
+
+    """
+    strategy, periods = setup['strategy'], setup['periods']
+    open_ = ohlc['Open'].to_numpy(dtype=float)
+    close = ohlc['Close'].to_numpy(dtype=float)
+
+    rows = []
+    for combo in combos:
+        if strategy == 'DCA':
+            book = eg.simulate_dca(open_, close, ohlc.index,
+                                   setup['balance'], **combo)
+        else:
+            weights = eg.target_weights(ohlc, strategy, setup['sizing'],
+                                        setup['field'], bank, **combo)
+            book = eg.simulate(open_, close, weights.to_numpy(),
+                               setup['balance'], setup['fee'])
+        stats = eg.performance(book['equity'], periods)
+        stats['trades'] = int(book['trade'].sum())
+        rows.append(dict(combo, **{key: float(stats[key]) for key in METRICS}))
+    return rows
+
+
+def run_sweep(ohlc, strategy, grid, sizing='Flat', balance=10000.,
+              field='Close', interval='D', fee=0., workers=None,
+              progress=None):
+    """
+      Backtest every combination of a parameter grid.
+
+      The rolling indicators are computed once for the whole grid and shared
+      by all combinations. Large grids are split over a process pool with
+      one worker per core.
+
+      Parameters:
+        ohlc (DataFrame): bars with at least Open, Close and `field`
+        strategy (str): a key of engine.STRATEGIES
+        grid (dict/str): parameter ranges, see parse_grid()
+        sizing, balance, field, interval, fee: as in engine.run()
+        workers (int): (default: None) pool size, the number of cores if None
+        progress (callable): (default: None) called with the fraction of
+          the combinations done, see jobs.JobQueue
+
+      Returns:
+        DataFrame: one row per combination, the parameters followed by the
+          METRICS columns, best Sharpe ratio first.
+
+    """
+    if isinstance(grid, str):
+        grid = parse_grid(grid, strategy)
+    combos = combinations(strategy, grid) or [{}]
+
+    ohlc = ohlc.dropna(subset=['Open', 'Close'])
+    bank = indicator_bank(ohlc[field], ohlc['Close'], strategy, combos, sizing)
+    setup = {'strategy': strategy, 'sizing': sizing, 'balance': balance,
+             'field': field, 'fee': fee,
+             'periods': eg.PERIODS.get(interval, 252)}
+
+    workers = workers or os.cpu_count() or 1
+    # A few chunks per worker keeps them all busy until the end
+    chunks = np.array_split(np.arange(len(combos)), 4 * workers)
+    chunks = [[combos[i] for i in chunk] for chunk in chunks if len(chunk)]
+    rows = []
+
+    if len(combos) < POOL_THRESHOLD or workers == 1:
+        for done, chunk in enumerate(chunks, 1):
+            rows += evaluate(ohlc, bank, setup, chunk)
+            if progress:
+                progress(done / len(chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=(ohlc, bank, setup)) as pool:
+            futures = [pool.submit(_evaluate_chunk, chunk) for chunk in chunks]
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    rows += future.result()
+                    if progress:
+                        progress(done / len(chunks))
+            except BaseException:
+                # e.g. the job was cancelled, drop what has not started
+                for future in futures:
+                    future.cancel()
+                raise
+
+    table = pd.DataFrame(rows, columns=sorted(grid) + METRICS)
+    return table.sort_values('sharpe', ascending=False, ignore_index=True)
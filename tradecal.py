@@ -0,0 +1,171 @@
+import datetime as dt
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from dateutil.easter import easter
+from dateutil.relativedelta import relativedelta, MO, TH
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+# Closures outside the holiday rules: 9/11, national days of mourning and
+# hurricane Sandy
+SPECIAL_CLOSURES = [
+    '2001-09-11', '2001-09-12', '2001-09-13', '2001-09-14',
+    '2004-06-11', '2007-01-02', '2012-10-29', '2012-10-30',
+    '2018-12-05', '2025-01-09',
+]
+
+# Regular session in exchange time, as hours
+SESSION_HOURS = (9.5, 16)
+
+
+# ---------------------------------- #
+#            NYSE HOLIDAYS           #
+# ---------------------------------- #
+
+def _observed(day):
+    # A holiday on Saturday is taken on Friday, on Sunday on Monday
+    if day.weekday() == 5:
+        return day - dt.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + dt.timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=None)
+def holidays(year):
+    """
+      NYSE full-day closures of a year, from the exchange's rules.
+
+      Parameters:
+        year (int): calendar year
+
+      Returns:
+        tuple: the closed weekdays, as sorted datetime.date
+
+    """
+    jan1 = dt.date(year, 1, 1)
+    days = [
+        # New Year's Day is not moved back into the previous year
+        jan1 + dt.timedelta(days=1) if jan1.weekday() == 6 else jan1,
+        # Washington's Birthday, 3rd Monday of February
+        dt.date(year, 2, 1) + relativedelta(weekday=MO(3)),
+        easter(year) - dt.timedelta(days=2),  # Good Friday
+        # Memorial Day, last Monday of May
+        dt.date(year, 5, 31) + relativedelta(weekday=MO(-1)),
+        _observed(dt.date(year, 7, 4)),
+        # Labor Day, 1st Monday of September
+        dt.date(year, 9, 1) + relativedelta(weekday=MO(1)),
+        # Thanksgiving, 4th Thursday of November
+        dt.date(year, 11, 1) + relativedelta(weekday=TH(4)),
+        _observed(dt.date(year, 12, 25)),
+    ]
+    if year >= 1998:
+        # Martin Luther King Jr. Day, 3rd Monday of January
+        days.append(dt.date(year, 1, 1) + relativedelta(weekday=MO(3)))
+    if year >= 2022:
+        days.append(_observed(dt.date(year, 6, 19)))  # Juneteenth
+    days += [pd.Timestamp(day).date() for day in SPECIAL_CLOSURES
+             if day.startswith(str(year))]
+
+    return tuple(sorted(day for day in set(days)
+                        if day.weekday() < 5 and day.year == year))
+
+
+def holiday_array(start, end):
+    """
+      The holidays between two dates, as a datetime64[D] array.
+
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    days = [day for year in range(start.year, end.year + 1)
+            for day in holidays(year)]
+    days = np.array(days, dtype='datetime64[D]')
+    return days[(days >= start.to_datetime64()) &
+                (days <= end.to_datetime64())]
+
+
+def _days(dates):
+    # Calendar days of any date-like array, as datetime64[D]
+    return pd.DatetimeIndex(dates).to_numpy().astype('datetime64[D]')
+
+
+# ---------------------------------- #
+#            SESSION LOOKUPS         #
+# ---------------------------------- #
+
+def is_session(dates):
+    """
+      Whether the NYSE trades on each date.
+
+      Parameters:
+        dates (DatetimeIndex/array): dates or times, only their day matters
+
+      Returns:
+        ndarray: booleans
+
+    """
+    days = _days(dates)
+    if not len(days):
+        return np.zeros(0, dtype=bool)
+    return np.is_busday(days, holidays=holiday_array(days.min(), days.max()))
+
+
+def sessions(start, end):
+    """
+      The NYSE trading days between two dates, both included.
+
+      Returns:
+        DatetimeIndex: named 'Date'
+
+    """
+    days = np.arange(np.datetime64(pd.Timestamp(start).date(), 'D'),
+                     np.datetime64(pd.Timestamp(end).date(), 'D') + 1)
+    return pd.DatetimeIndex(days[is_session(days)], name='Date')
+
+
+def roll_back(dates):
+    """
+      Every date moved back to the closest trading day, itself if it is one.
+
+      Resampled bars are labelled with the period's end, e.g. a Sunday; this
+      puts the label on the bar's last possible session instead.
+
+      Returns:
+        DatetimeIndex: with the name of `dates`
+
+    """
+    index = pd.DatetimeIndex(dates)
+    days = _days(index)
+    if not len(days):
+        return index
+    hols = holiday_array(days.min() - np.timedelta64(14, 'D'), days.max())
+    rolled = np.busday_offset(days, 0, roll='backward', holidays=hols)
+    return pd.DatetimeIndex(rolled.astype('datetime64[ns]'), name=index.name)
+
+
+def rangebreaks(start, end, intraday=False):
+    """
+      Plotly x-axis breaks hiding the closed days (and hours) of a range.
+
+      Parameters:
+        start, end (date): the range of the chart
+        intraday (bool): (default: False) also hide the hours out of the
+          regular session
+
+      Returns:
+        list: the axis' rangebreaks
+
+    """
+    breaks = [dict(bounds=['sat', 'mon'])]
+    closed = holiday_array(start, end)
+    if len(closed):
+        breaks.append(dict(values=[str(day) for day in closed]))
+    if intraday:
+        breaks.append(dict(bounds=[SESSION_HOURS[1], SESSION_HOURS[0]],
+                           pattern='hour'))
+    return breaks
@@ -0,0 +1,179 @@
+import re
+import io
+import os
+import logging as log
+
+import numpy as np
+import pandas as pd
+
+from settings import GlobVars
+
+
+# ---------------------------------- #
+#         CONSTANT PARAMETERS        #
+# ---------------------------------- #
+
+logger = log.getLogger(__name__)
+
+myvars = GlobVars()
+
+# What a symbol typed in full may look like, e.g. 'BRK-B' or '^GSPC'
+SYMBOL_PATTERN = re.compile(r'^\^?[A-Z0-9][A-Z0-9.\-=]{0,9}$')
+
+# NASDAQ Trader's directory of the US listed symbols, see build()
+DIRECTORY = {
+    'https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt': 'Symbol',
+    'https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt':
+        'ACT Symbol',
+}
+
+
+# ---------------------------------- #
+#           TICKER UNIVERSE          #
+# ---------------------------------- #
+
+def _upper_bound(prefix):
+    # The smallest string after every string starting with `prefix`
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class TickerUniverse:
+    """
+      The symbols the app knows of, with their names, for autocomplete.
+
+      Symbols and lower-cased names are kept in sorted arrays, a prefix is
+      two binary searches away from its matches.
+
+    """
+
+    def __init__(self, path=None):
+        path = path or myvars.tickerfile
+        try:
+            # 'NA' is a ticker, not a missing value
+            df = pd.read_csv(path, keep_default_na=False, dtype=str)
+        except OSError:
+            logger.warning('No ticker file at %s', path)
+            df = pd.DataFrame(columns=['Symbol', 'Name'])
+
+        df['Symbol'] = df['Symbol'].str.strip().str.upper()
+        df = df.drop_duplicates('Symbol').sort_values('Symbol')
+        self.symbols = df['Symbol'].to_numpy().astype(str)
+        self.names = df['Name'].to_numpy().astype(str)
+
+        order = np.argsort(np.char.lower(self.names), kind='stable')
+        self._by_name = order
+        self._lower_names = np.char.lower(self.names)[order]
+
+    def __contains__(self, symb):
+        symb = symb.upper()
+        at = self.symbols.searchsorted(symb)
+        return at < len(self.symbols) and self.symbols[at] == symb
+
+    def name(self, symb):
+        at = self.symbols.searchsorted(symb.upper())
+        if at < len(self.symbols) and self.symbols[at] == symb.upper():
+            return self.names[at]
+        return ''
+
+    def search(self, text, limit=10):
+        """
+          Symbols starting with a prefix, then those whose name does.
+
+          Parameters:
+            text (str): what was typed so far, case insensitive
+            limit (int): (default: 10) most matches returned
+
+          Returns:
+            list: (symbol, name) tuples, the exact symbol first
+
+        """
+        text = (text or '').strip()
+        if not text:
+            return []
+
+        prefix = text.upper()
+        lo = self.symbols.searchsorted(prefix)
+        hi = self.symbols.searchsorted(_upper_bound(prefix))
+        found = list(range(lo, min(hi, lo + limit)))
+
+        if len(found) < limit:
+            prefix = text.lower()
+            lo = self._lower_names.searchsorted(prefix)
+            hi = self._lower_names.searchsorted(_upper_bound(prefix))
+            for at in self._by_name[lo:hi]:
+                if at not in found:
+                    found.append(at)
+                if len(found) == limit:
+                    break
+
+        return [(self.symbols[at], self.names[at]) for at in found]
+
+    def resolve(self, text, confirm=None):
+        """
+          The symbol a submitted text stands for, None if it isn't one.
+
+          A known symbol is always accepted. The bundled list may miss
+          recent listings: an unknown one that looks like a ticker is
+          accepted once `confirm` finds it upstream.
+
+          Parameters:
+            text (str): what was submitted, case insensitive
+            confirm (callable): (default: None) confirm(symb) is True if the
+              data provider knows the symbol, unknown symbols are refused
+              if None
+
+        """
+        symb = (text or '').strip().upper()
+        if symb in self:
+            return symb
+        if confirm is None or not SYMBOL_PATTERN.match(symb):
+            return None
+        try:
+            known = confirm(symb)
+        except Exception:
+            logger.exception('Could not look %s up', symb)
+            known = False
+        return symb if known else None
+
+
+def build(path=None):
+    """
+      Rebuild the ticker file from NASDAQ Trader's symbol directory.
+
+      Parameters:
+        path (str): (default: None) where to write it, `tickerfile` in
+          settings if None
+
+    """
+    import requests
+
+    path = path or myvars.tickerfile
+    frames = []
+    for url, column in DIRECTORY.items():
+        text = requests.get(url, timeout=30).text
+        # The last line is the file's creation time
+        df = pd.read_csv(io.StringIO(text), sep='|', dtype=str,
+                         keep_default_na=False)[:-1]
+        df = df[df['Test Issue'] != 'Y']
+        frames.append(pd.DataFrame({'Symbol': df[column],
+                                    'Name': df['Security Name']}))
+
+    # Yahoo! writes class shares with a dash, e.g. BRK-B
+    df = pd.concat(frames)
+    df['Symbol'] = df['Symbol'].str.replace('.', '-', regex=False)
+
+    kept = pd.read_csv(path, keep_default_na=False, dtype=str) \
+        if os.path.exists(path) else None
+    if kept is not None:
+        # Keep the indices, they are not listed
+        df = pd.concat([kept[kept['Symbol'].str.startswith('^')], df])
+    df.drop_duplicates('Symbol').sort_values('Symbol').to_csv(path,
+                                                              index=False)
+
+
+# Shared by the pages of a worker
+UNIVERSE = TickerUniverse()
+
+
+if __name__ == '__main__':
+    build()